@@ -0,0 +1,350 @@
+"""
+Benchmark für Indexierung, Suche und Stöbern.
+
+Baut synthetische Tantivy-Indizes (Standard: 300, 7.300 und 100.000
+Serien) mit dem Schema aus catalog.py. Als Ausgangsdaten dienen
+series.csv und imdb.csv; die Zeilen werden bis zur gewünschten Größe
+wiederholt. Wikipedia und TMDB werden durch einen `requests`-Adapter mit
+deterministischen Antworten ersetzt, die Indexierung läuft sonst über
+denselben Code wie indexing.py: Stufe "enrich" (Sessions, `enrich_row`,
+`enrich_concurrently`, Parquet-Snapshot) und Stufe "index"
+(`index_stage` mit Writer-Heap und -Threads).
+
+Gemessen werden die echten Codepfade der Seiten:
+- Titelsuche (search.search, seite2/series_platform)
+- Filter (search.filter_query + paginate, seite2) und Trefferzahlen je Filter
+- Reihen der Startseite aus der Sidecar-Datei (shelves.py, seite1)
+- Detailansicht über die Serien-ID (CardStore)
+- Durchsatz beim Anreichern und beim Indexieren aus dem Snapshot (Dokumente/s)
+
+Ergebnis ist ein JSON-Bericht mit p50/p95 je Abfrage, Dokumenten pro
+Sekunde und maximalem Speicherverbrauch (RSS), damit Läufe über die Zeit
+verglichen werden können. Bei mehreren Größen läuft jede in einem eigenen
+Prozess: `ru_maxrss` ist der Höchststand des ganzen Prozesses, und nur so
+gehört `peak_rss_mb` zu genau einer Größe (inkl. Laden der Ausgangsdaten).
+
+Aufruf:
+    python benchmark.py [--sizes 300 7300 100000] [--repeats 200]
+                        [--output benchmark.json] [--keep DIR]
+                        [--index-threads 0] [--heap-size N]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import requests
+import tantivy
+from requests.adapters import BaseAdapter
+
+import indexing
+import search
+import filters
+import shelves
+import snapshot
+from cards import get_card_store
+from catalog import get_catalog
+from enrichment import enrich_concurrently
+
+SIZES = [300, 7300, 100000]
+REPEATS = 200          # Messungen je Abfrageart und Indexgröße
+SEED = 42              # Zufallsauswahl der Suchbegriffe, Filter und IDs
+SHELF_LIMIT = 12       # Cards je Reihe, wie seiten/seite1.py
+OUTPUT_PATH = "benchmark.json"
+
+
+# Deterministische Wikipedia-/TMDB-Antworten statt Netzwerkzugriffen
+class StubAdapter(BaseAdapter):
+    def __init__(self, vocabulary: list[str]):
+        super().__init__()
+        self.vocabulary = vocabulary
+
+    def _words(self, rng: random.Random, n: int) -> str:
+        return " ".join(rng.choice(self.vocabulary) for _ in range(n))
+
+    def _videos(self, rng: random.Random) -> dict:
+        return {"results": [{
+            "site": "YouTube", "type": "Trailer", "iso_639_1": "en",
+            "key": f"{rng.getrandbits(40):011x}",
+        }]}
+
+    def _payload(self, url: str) -> dict:
+        parsed = urlparse(url)
+        rng = random.Random(zlib.crc32(url.encode()))
+        if parsed.netloc.endswith("wikipedia.org"):
+            title = parse_qs(parsed.query).get("titles", [""])[0]
+            page_id = zlib.crc32(title.encode()) or 1
+            return {"query": {"pages": {str(page_id): {
+                "pageid": page_id, "ns": 0, "title": title,
+                "extract": f"{title} is a television series. {self._words(rng, 60)}",
+            }}}}
+        if parsed.path.endswith("/videos"):
+            # nur Videos (refresh_trailers.py)
+            return self._videos(rng)
+        if "/tv/" in parsed.path:
+            # Details samt Videos (append_to_response=videos)
+            return {
+                "id": int(parsed.path.rsplit("/", 1)[-1]),
+                "overview": self._words(rng, 40),
+                "poster_path": f"/{rng.getrandbits(64):016x}.jpg" if rng.random() < 0.9 else None,
+                "genres": [{"id": genre, "name": str(genre)} for genre in
+                           rng.sample([16, 18, 35, 37, 80, 99, 9648, 10759, 10765, 10768], 2)],
+                "popularity": round(rng.uniform(0.5, 500.0), 3),
+                "vote_average": round(rng.uniform(4.0, 9.5), 1) if rng.random() < 0.85 else 0,
+                "vote_count": rng.randrange(0, 20000),
+                "number_of_seasons": rng.randrange(1, 12),
+                "networks": [{"id": 49, "name": "HBO"}],
+                "videos": self._videos(rng),
+            }
+        return {"tv_results": [{"id": rng.randrange(1, 10 ** 6)}]}
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps(self._payload(request.url)).encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def setup_stub_clients(vocabulary: list[str]) -> None:
+    # Die echten Sessions aus indexing.py, nur der Transport wird ersetzt
+    indexing.setup_clients(None)
+    adapter = StubAdapter(vocabulary)
+    for session in (indexing.wiki._session, indexing.tmdb_session):
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+
+def synthetic_rows(data, size: int):
+    # Zeilen der CSV-Daten bis zur gewünschten Größe wiederholen; jede Kopie
+    # bekommt eine eigene IMDb-ID, damit die TMDB-Antworten variieren.
+    records = indexing.preprocess(data)
+    for i in range(size):
+        row = dict(records[i % len(records)])
+        if i >= len(records):
+            row["imdb"] = f"{row['imdb']}-{i // len(records)}"
+        row.update(key=f"{row['series']} {row['imdb']}", hash="", id=i, skipped=False)
+        yield i, row
+
+
+def throughput(docs: int, seconds: float) -> dict:
+    return {"docs": docs, "seconds": round(seconds, 3), "docs_per_sec": round(docs / seconds, 1)}
+
+
+def build_index(path: str, data, size: int, args) -> dict:
+    snapshot_path = path + ".parquet"
+    snapshot.clear(snapshot_path)
+    # Die Stufen melden jede Zeile per print – im Benchmark nur Rauschen
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rows = synthetic_rows(data, size)
+        records = [record for _, record in enrich_concurrently(
+            rows, indexing.enrich_row, args.workers, indexing.MAX_IN_FLIGHT) if record is not None]
+        snapshot.write_part(snapshot_path, records)
+        snapshot.compact(snapshot_path)
+        enrich = throughput(len(records), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        stage_args = argparse.Namespace(
+            snapshot=snapshot_path, incremental=False, heap_size=args.heap_size,
+            index_threads=args.index_threads,
+        )
+        written, segments = indexing.index_stage(stage_args, path)
+        index = throughput(written, time.perf_counter() - start)
+    return {
+        "enrich": enrich,
+        "index": index,
+        "segments": segments,
+        "snapshot_bytes": os.path.getsize(snapshot_path),
+    }
+
+
+def measure(fn, args_list) -> dict:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    # quantiles braucht mindestens zwei Messwerte (--repeats 1)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "n": len(samples),
+        "p50_ms": round(cuts[49], 4),
+        "p95_ms": round(cuts[94], 4),
+        "max_ms": round(max(samples), 4),
+    }
+
+
+def peak_rss_mb() -> float:
+    # Höchststand des ganzen Prozesses seit dem Start, nicht der aktuellen Messung;
+    # ru_maxrss ist unter Linux in KiB, unter macOS in Byte
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def bench_queries(path: str, data, size: int, repeats: int, rng: random.Random) -> dict:
+    catalog = get_catalog(path)
+    start = time.perf_counter()
+    store = get_card_store(catalog)
+    store_ms = (time.perf_counter() - start) * 1000
+    searcher = store.searcher
+
+    # Suchbegriffe: einzelne Wörter aus den Serientiteln
+    words = sorted({w for title in data["seriesLabel"] for w in str(title).lower().split() if len(w) > 3})
+    terms = [(rng.choice(words),) for _ in range(repeats)]
+
+    genres = filters.genre_table().groups
+    countries = filters.country_table().groups
+    selections = []
+    for _ in range(repeats):
+        selections.append((
+            rng.sample(genres, rng.randint(0, 2)),
+            rng.sample(countries, rng.randint(0, 1)),
+            rng.sample(search.RATING_OPTIONS, rng.randint(0, 2)),
+        ))
+
+    def title_search(q):
+        hits, _, _ = search.search(catalog, q, searcher=searcher)
+        search.page_cards(store, hits)
+
+    def filter_page(genre_sel, country_sel, rating_sel):
+        query = search.filter_query(None, genre_sel, country_sel, rating_sel)
+        hits, _, _ = search.paginate(searcher, query)
+        search.page_cards(store, hits)
+
+    def filter_counts(genre_sel, country_sel, rating_sel):
+        # Ohne Cache messen: jede Auswahl wird neu ausgewertet
+        search._count_cache.clear()
+        search.facet_counts(catalog, "", genre_sel, country_sel, rating_sel)
+
+    start = time.perf_counter()
+    shelves.load(catalog)
+    shelves_ms = (time.perf_counter() - start) * 1000
+
+    def shelf(name):
+        ids = shelves.load(catalog)[name]
+        if name == "pool":
+            ids = rng.sample(ids, min(SHELF_LIMIT, len(ids)))
+        for doc_id in ids[:SHELF_LIMIT]:
+            store.get(doc_id)
+
+    ids = [(rng.randrange(size),) for _ in range(repeats)]
+
+    return {
+        "card_store_build_ms": round(store_ms, 1),
+        "shelves_load_ms": round(shelves_ms, 1),
+        "title_search": measure(title_search, terms),
+        "filter": measure(filter_page, selections),
+        "filter_counts": measure(filter_counts, selections),
+        "shelf_newest": measure(shelf, [("newest",)] * repeats),
+        "shelf_popular": measure(shelf, [("popular",)] * repeats),
+        "shelf_random": measure(shelf, [("pool",)] * repeats),
+        "detail_lookup": measure(store.get, ids),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(size: int, data, args, workdir: str) -> dict:
+    path = os.path.join(workdir, f"serien_{size}")
+    shutil.rmtree(path, ignore_errors=True)
+    print(f"{size} Serien: indexieren ...")
+    result = {"indexing": build_index(path, data, size, args)}
+    print(f"{size} Serien: Abfragen messen ...")
+    result.update(bench_queries(path, data, size, args.repeats, random.Random(args.seed)))
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result, indent=2))
+    return result
+
+
+def bench_size_isolated(size: int, args, workdir: str) -> dict:
+    # Eine Größe in einem eigenen Prozess messen, damit peak_rss_mb nur sie umfasst
+    output = os.path.join(workdir, f"serien_{size}.json")
+    subprocess.run([
+        sys.executable, os.path.abspath(__file__), "--sizes", str(size),
+        "--repeats", str(args.repeats), "--workers", str(args.workers),
+        "--index-threads", str(args.index_threads), "--heap-size", str(args.heap_size),
+        "--seed", str(args.seed), "--output", output, "--keep", workdir,
+    ], check=True)
+    with open(output, "r", encoding="utf-8") as f:
+        return json.load(f)["sizes"][str(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexierung, Suche und Filter messen.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Indexgrößen (Anzahl Serien)")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="Messungen je Abfrageart")
+    parser.add_argument("--workers", type=int, default=indexing.MAX_WORKERS, help="Threads beim Indexieren")
+    parser.add_argument("--index-threads", type=int, default=indexing.WRITER_THREADS, help="Writer-Threads")
+    parser.add_argument("--heap-size", type=int, default=indexing.WRITER_HEAP, help="Writer-Heap in Byte")
+    parser.add_argument("--seed", type=int, default=SEED, help="Startwert für die Zufallsauswahl")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Pfad des JSON-Berichts")
+    parser.add_argument("--keep", metavar="DIR", help="Indizes in DIR anlegen und behalten")
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error("--repeats muss mindestens 1 sein")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "tantivy": getattr(tantivy, "__version__", None),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "workers": args.workers,
+            "index_threads": args.index_threads,
+            "heap_size": args.heap_size,
+            "peak_rss": "Höchststand je Prozess, eine Größe je Prozess",
+        },
+        "sizes": {},
+    }
+
+    workdir = args.keep or tempfile.mkdtemp(prefix="serien_bench_")
+    try:
+        if len(args.sizes) == 1:
+            data = indexing.load_data()
+            vocabulary = sorted({w for text in data["seriesLabel"] for w in str(text).split()})
+            setup_stub_clients(vocabulary)
+            results = {args.sizes[0]: bench_size(args.sizes[0], data, args, workdir)}
+        else:
+            results = {size: bench_size_isolated(size, args, workdir) for size in args.sizes}
+        report["sizes"] = {str(size): result for size, result in results.items()}
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Bericht geschrieben: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
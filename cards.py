@@ -0,0 +1,77 @@
+"""
+Kompakte Card-Projektion des Index für Raster- und Detailansichten.
+
+Jeder `searcher.doc()`-Aufruf entpackt einen ganzen Docstore-Block, obwohl
+Cards nur wenige Felder brauchen. `CardStore` liest deshalb alle Dokumente
+einmal pro Index-Generation und hält je Serie einen schlanken `Card`-
+Datensatz. Raster (über die DocAddress eines Treffers) und Detailansichten
+(über die Serien-ID aus `?id=`) sind danach reine Dictionary-Zugriffe.
+"""
+
+import threading
+
+from tantivy import Query
+
+import tracing
+
+
+class Card:
+    __slots__ = ("id", "title", "poster", "start", "genres", "countries", "rating", "overview", "trailer")
+
+    def __init__(self, doc: dict):
+        self.id = doc["id"][0]
+        self.title = doc["title"][0]
+        self.poster = doc["tmdb_poster_path"][0] if doc.get("tmdb_poster_path") else None
+        self.start = doc["start"][0] if doc.get("start") else None
+        self.genres = tuple(doc.get("genres", ()))
+        self.countries = tuple(doc.get("countries", ()))
+        self.rating = float(doc["tmdb_vote_average"][0]) if doc.get("tmdb_vote_average") else 0.0
+        overview = doc.get("tmdb_overview") or doc.get("description") or [""]
+        self.overview = overview[0]
+        self.trailer = doc["trailer"][0] if doc.get("trailer") else None
+
+
+class CardStore:
+    def __init__(self, searcher, generation=None):
+        # Searcher und Index-Generation, aus denen die Cards stammen. DocAddresses für
+        # `by_address` müssen von genau diesem Searcher kommen (siehe Seiten).
+        self.searcher = searcher
+        self.generation = generation
+        self.by_id: dict[int, Card] = {}
+        self._by_address: dict[tuple[int, int], Card] = {}
+        with tracing.span("cards.build"):
+            hits = searcher.search(Query.all_query(), max(1, searcher.num_docs), count=False).hits
+            for _, addr in hits:
+                card = Card(searcher.doc(addr).to_dict())
+                self.by_id[card.id] = card
+                self._by_address[(addr.segment_ord, addr.doc)] = card
+        tracing.count("docs_fetched", len(hits))
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, doc_id) -> Card | None:
+        try:
+            return self.by_id.get(int(doc_id))
+        except (TypeError, ValueError):
+            return None
+
+    def by_address(self, addr) -> Card | None:
+        return self._by_address.get((addr.segment_ord, addr.doc))
+
+
+_stores: dict[str, tuple] = {}
+_stores_lock = threading.Lock()
+
+
+def get_card_store(catalog) -> CardStore:
+    # Einmal je Index-Generation aufbauen; nach einem Reload wird neu gelesen
+    searcher, generation = catalog.current()
+    cached = _stores.get(catalog.path)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    with _stores_lock:
+        cached = _stores.get(catalog.path)
+        if cached is None or cached[0] != generation:
+            cached = _stores[catalog.path] = (generation, CardStore(searcher, generation))
+    return cached[1]
@@ -0,0 +1,125 @@
+"""
+Gemeinsames Schema und gemeinsamer Index-Zugriff.
+
+Indexierung, Streamlit-Seiten und Hilfsskripte verwenden dasselbe Schema
+aus diesem Modul. Die Seiten öffnen den Index über `get_catalog()`: Der
+Index wird einmal pro Prozess geöffnet und von allen Sitzungen geteilt.
+`Catalog.searcher()` lädt den Index nur neu, wenn sich `meta.json`
+geändert hat (d. h. nach einem Commit der Indexierung) – nicht bei jedem
+Rerun der Seite. Caches je Index-Generation holen Searcher und Generation
+gemeinsam über `Catalog.current()`, damit beide zum selben Reload gehören.
+"""
+
+import os
+import threading
+
+from tantivy import Index, SchemaBuilder
+
+import tracing
+
+INDEX_PATH = "serien_300"  # bestehendes Tantivy-Index-Verzeichnis
+
+
+def build_schema():
+    schema_builder = SchemaBuilder()
+    # Text-Felder
+    schema_builder.add_text_field("wikidata", stored=True)
+    schema_builder.add_text_field("url", stored=True)
+    schema_builder.add_text_field("title", stored=True, tokenizer_name='en_stem')
+    schema_builder.add_text_field("description", stored=True, tokenizer_name='en_stem')  # Mehrwertiges Textfeld
+    schema_builder.add_text_field("image", stored=True)
+    schema_builder.add_text_field("locations", stored=True)
+    schema_builder.add_text_field("countries", stored=True)
+    schema_builder.add_text_field("genres", stored=True)
+    schema_builder.add_text_field("tmdb_overview", stored=True, tokenizer_name='en_stem')
+    schema_builder.add_text_field("tmdb_poster_path", stored=True)
+    schema_builder.add_text_field("trailer", stored=True)
+
+    # Integer-Felder
+    schema_builder.add_integer_field("id", stored=True, indexed=True)
+    schema_builder.add_integer_field("follower", stored=True, fast=True)
+    schema_builder.add_integer_field("score", stored=True, fast=True)
+    schema_builder.add_integer_field("start", stored=True, fast=True)
+    schema_builder.add_integer_field("tmdb_genre_ids", stored=True, indexed=True)
+    schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
+    # Bewertung in Halbsternen 0–10 (siehe rating_bucket), für die Bewertungsfilter
+    schema_builder.add_integer_field("rating_bucket", indexed=True, fast=True)
+
+    # Float-Felder
+    schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
+    schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
+
+    # Facet-Felder (für hierarchische Filter/Navigation)
+    schema_builder.add_facet_field("facet_locations")
+    schema_builder.add_facet_field("facet_countries")
+    schema_builder.add_facet_field("facet_genres")
+
+    return schema_builder.build()
+
+
+schema = build_schema()
+
+
+def rating_bucket(vote_average) -> int:
+    # TMDB-Bewertung (0–10) abgerundet = Halbsterne auf der 5-Sterne-Skala;
+    # ohne Bewertung 0. Ein Filter [min, max) Sterne entspricht damit den
+    # Buckets min*2 bis max*2 (exklusiv).
+    if not vote_average:
+        return 0
+    return min(10, max(0, int(vote_average)))
+
+
+class Catalog:
+    """Ein geöffneter Index plus Searcher, der bei neuen Commits erneuert wird."""
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self.index = Index(schema, path=str(path))
+        # Neu geladen wird ausschließlich über searcher(), siehe unten
+        self.index.config_reader(reload_policy="Manual")
+        self.lock = threading.Lock()
+        # (Searcher, Generation) als ein Tupel, damit Leser nie ein gemischtes Paar sehen
+        self._current = (None, None)
+
+    def _meta_stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.path, "meta.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def current(self) -> tuple:
+        """Aktueller Searcher und seine Generation (Stempel von `meta.json`) als Paar."""
+        stamp = self._meta_stamp()
+        current = self._current
+        if current[0] is None or stamp != current[1]:
+            with self.lock:
+                current = self._current
+                if current[0] is None or stamp != current[1]:
+                    with tracing.span("index.reload"):
+                        self.index.reload()
+                        current = self._current = (self.index.searcher(), stamp)
+        return current
+
+    def searcher(self):
+        return self.current()[0]
+
+    @property
+    def generation(self):
+        return self._current[1]
+
+
+_catalogs: dict[str, Catalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path: str = INDEX_PATH) -> Catalog:
+    # Ein Catalog je Index-Pfad und Prozess (Module bleiben über Reruns hinweg geladen)
+    catalog = _catalogs.get(path)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(path)
+            if catalog is None:
+                with tracing.span("index.open"):
+                    catalog = _catalogs[path] = Catalog(path)
+    return catalog
@@ -0,0 +1,256 @@
+"""
+Nebenläufige Anreicherung der Seriendaten (Wikipedia + TMDB).
+
+Die Indexierung verbringt fast die gesamte Laufzeit mit Warten auf das
+Netzwerk. Dieses Modul stellt deshalb zwei Bausteine bereit:
+
+1) `ThrottledAdapter`: ein `requests`-Adapter mit Token-Bucket je Host,
+   damit die Rate-Limits von Wikipedia und TMDB eingehalten werden.
+   Er setzt einen Standard-Timeout, wiederholt Anfragen bei 429/5xx und
+   Verbindungsfehlern mit exponentiellem Backoff (bzw. nach der Vorgabe
+   aus `Retry-After`) und erfasst in `RequestStats` Latenzen und Fehler
+   je Endpunkt.
+2) `enrich_concurrently`: verteilt die Anreicherung auf einen Thread-Pool,
+   begrenzt die Anzahl gleichzeitig offener Aufträge und liefert die
+   fertigen Ergebnisse über eine Queue an den (einzigen) Index-Writer.
+"""
+
+import queue
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterable, Iterator
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = (5, 30)  # Sekunden: Verbindungsaufbau, Lesen
+MAX_RETRIES = 4            # Wiederholungen nach dem ersten Versuch
+BACKOFF_BASE = 0.5         # Sekunden, verdoppelt sich je Versuch
+BACKOFF_MAX = 60.0         # längste Wartezeit (auch für Retry-After)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Einfacher Token-Bucket: `rate` Anfragen pro Sekunde, `burst` auf Vorrat."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        # Blockiert, bis ein Token verfügbar ist
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Verwaltet je Host einen eigenen Token-Bucket."""
+
+    def __init__(self, rates: dict[str, float], default_rate: float | None = None, burst: int = 1):
+        self.rates = rates
+        self.default_rate = default_rate
+        self.burst = burst
+        self.buckets: dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        host = urlparse(url).hostname or ""
+        rate = self.rates.get(host, self.default_rate)
+        if not rate:
+            return  # Host ohne Limit
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(rate, self.burst)
+        bucket.acquire()
+
+
+def endpoint(url: str) -> str:
+    # Host + Pfad, IDs durch Platzhalter ersetzt: /3/tv/1399/videos -> /3/tv/{id}/videos
+    # (das erste Segment bleibt stehen, es ist bei TMDB die API-Version)
+    parsed = urlparse(url)
+    parts = parsed.path.split("/")
+    path = "/".join(
+        "{id}" if i > 1 and re.fullmatch(r"(tt)?\d+", part) else part for i, part in enumerate(parts)
+    )
+    return (parsed.hostname or "") + path
+
+
+class RequestStats:
+    """Anfragen, Wiederholungen, Fehler und Latenzen (ms) je Endpunkt."""
+
+    def __init__(self):
+        self.endpoints: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def _entry(self, url: str) -> dict:
+        return self.endpoints.setdefault(
+            endpoint(url), {"requests": 0, "retries": 0, "errors": 0, "latencies": []}
+        )
+
+    def record(self, url: str, ms: float, ok: bool) -> None:
+        with self.lock:
+            entry = self._entry(url)
+            entry["requests"] += 1
+            entry["latencies"].append(ms)
+            if not ok:
+                entry["errors"] += 1
+
+    def retry(self, url: str) -> None:
+        with self.lock:
+            self._entry(url)["retries"] += 1
+
+    def summary(self) -> dict[str, dict]:
+        result = {}
+        with self.lock:
+            for name, entry in sorted(self.endpoints.items()):
+                latencies = sorted(entry["latencies"]) or [0.0]
+                result[name] = {
+                    "requests": entry["requests"],
+                    "retries": entry["retries"],
+                    "errors": entry["errors"],
+                    "p50_ms": round(latencies[len(latencies) // 2], 1),
+                    "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                    "max_ms": round(latencies[-1], 1),
+                }
+        return result
+
+
+def retry_after(response) -> float | None:
+    # Retry-After als Sekunden oder HTTP-Datum
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """
+    HTTP-Adapter, der vor jedem Versuch ein Token beim Limiter holt.
+
+    Ohne explizites `timeout` gilt `DEFAULT_TIMEOUT`. Antworten mit einem
+    Status aus `RETRY_STATUS` sowie Verbindungsfehler und Timeouts werden
+    bis zu `max_retries`-mal wiederholt; die letzte Antwort bzw. Ausnahme
+    wird durchgereicht.
+    """
+
+    def __init__(self, limiter: HostRateLimiter, stats: RequestStats | None = None,
+                 retries: int = MAX_RETRIES, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.limiter = limiter
+        self.stats = stats
+        self.retries = retries
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        attempt = 0
+        while True:
+            self.limiter.acquire(request.url)
+            started = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(request.url, started, ok=False)
+                if attempt >= self.retries:
+                    raise
+                wait = None
+            else:
+                ok = response.status_code < 400 or response.status_code == 404
+                self._record(request.url, started, ok)
+                if response.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return response
+                wait = retry_after(response)
+                response.close()
+
+            if wait is None:
+                # Exponentielles Backoff mit Jitter, damit die Worker nicht gleichzeitig wiederkommen
+                wait = BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+            if self.stats is not None:
+                self.stats.retry(request.url)
+            time.sleep(min(wait, BACKOFF_MAX))
+            attempt += 1
+
+    def _record(self, url: str, started: float, ok: bool) -> None:
+        if self.stats is not None:
+            self.stats.record(url, (time.perf_counter() - started) * 1000, ok)
+
+
+_DONE = object()
+
+
+class _FeedError:
+    # Ausnahme beim Lesen von `items` im Feeder-Thread, wird im Aufrufer erneut ausgelöst
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def enrich_concurrently(
+    items: Iterable[Any],
+    enrich: Callable[[Any], Any],
+    max_workers: int = 8,
+    max_in_flight: int = 32,
+) -> Iterator[Any]:
+    """
+    Führt `enrich(item)` nebenläufig für alle Einträge aus und liefert die
+    Ergebnisse in Fertigstellungsreihenfolge.
+
+    Es sind höchstens `max_in_flight` Aufträge gleichzeitig unterwegs
+    (laufend oder fertig, aber noch nicht abgeholt), damit der Speicher auch
+    bei langsamen Konsumenten begrenzt bleibt. Fehler in `enrich` werden
+    protokolliert und übersprungen. Schlägt dagegen das Lesen von `items`
+    fehl, wird die Ausnahme nach den bereits fertigen Ergebnissen im
+    Aufrufer erneut ausgelöst.
+    """
+    results: queue.Queue = queue.Queue()
+    slots = threading.BoundedSemaphore(max_in_flight)
+
+    def feed():
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for item in items:
+                    slots.acquire()
+                    future = pool.submit(enrich, item)
+                    future.add_done_callback(results.put)
+        except BaseException as e:
+            results.put(_FeedError(e))
+        finally:
+            results.put(_DONE)
+
+    threading.Thread(target=feed, name="enrichment-feeder", daemon=True).start()
+
+    while True:
+        future = results.get()
+        if future is _DONE:
+            break
+        if isinstance(future, _FeedError):
+            raise future.error
+        slots.release()
+        try:
+            yield future.result()
+        except Exception as e:
+            print(f"{e} Enrichment failed. Skipping item")
@@ -0,0 +1,94 @@
+"""
+Filtergruppen für Genres und Länder (genres.json, countries.json).
+
+Jeder Tag aus den CSV-Daten (z. B. "Nordic noir") gehört zu einer oder
+zwei Filtergruppen (z. B. "Crime / Detective / Police" und "Thriller").
+Die Indexierung legt diese Gruppen als Facetten in `facet_genres` bzw.
+`facet_countries` ab; die Stöbern-Seite filtert dann direkt im Index über
+Facetten-Abfragen, statt jedes Dokument in Python zu prüfen.
+
+Die Zuordnungen werden einmal pro Prozess zu `FilterTable`s kompiliert
+und erst nach einer Änderung der JSON-Datei (mtime) neu eingelesen.
+"""
+
+import json
+import os
+import threading
+
+from tantivy import Facet
+
+import tracing
+
+GENRES_PATH = "genres.json"
+COUNTRIES_PATH = "countries.json"
+
+
+class FilterTable:
+    """
+    Kompilierte Zuordnung Tag -> Filtergruppen.
+
+    Jede Gruppe bekommt ein Bit (Reihenfolge = alphabetisch), jeder Tag die
+    Bitmaske seiner Gruppen. Die Gruppen mehrerer Tags ergeben sich damit
+    aus einem `|` über die Masken statt einer Schleife über die JSON-Einträge.
+    """
+
+    __slots__ = ("groups", "bits", "masks")
+
+    def __init__(self, data: list[dict]):
+        names = sorted(
+            {entry["filter"] for entry in data}
+            | {entry["filter2"] for entry in data if entry.get("filter2")}
+        )
+        self.groups = tuple(names)
+        self.bits = {name: 1 << i for i, name in enumerate(names)}
+        self.masks: dict[str, int] = {}
+        for entry in data:
+            tag = entry["tag"].lower()
+            for key in ("filter", "filter2"):
+                if entry.get(key):
+                    self.masks[tag] = self.masks.get(tag, 0) | self.bits[entry[key]]
+
+    def mask(self, tags) -> int:
+        result = 0
+        for tag in tags:
+            result |= self.masks.get(tag.strip().lower(), 0)
+        return result
+
+    def names(self, mask: int) -> list[str]:
+        return [name for i, name in enumerate(self.groups) if mask >> i & 1]
+
+    def resolve(self, tags) -> list[str]:
+        # Filtergruppen zu einer Liste von Tags, ohne Duplikate
+        return self.names(self.mask(tags))
+
+
+_tables: dict[str, tuple[int, FilterTable]] = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(path: str) -> FilterTable:
+    # Einmal pro Prozess laden; neu eingelesen wird nur, wenn sich die Datei ändert
+    mtime = os.stat(path).st_mtime_ns
+    cached = _tables.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is None or cached[0] != mtime:
+            with tracing.span("filters.load"), open(path, "r", encoding="utf-8") as f:
+                cached = _tables[path] = (mtime, FilterTable(json.load(f)))
+    return cached[1]
+
+
+def genre_table() -> FilterTable:
+    return get_table(GENRES_PATH)
+
+
+def country_table() -> FilterTable:
+    return get_table(COUNTRIES_PATH)
+
+
+def group_facet(name: str) -> Facet:
+    # Gruppennamen wie "Crime / Detective / Police" enthalten "/", das in
+    # Facetten als Pfadtrenner gilt – deshalb maskieren.
+    return Facet.from_string("/" + name.replace("/", "\\/"))
@@ -0,0 +1,82 @@
+"""
+Zwischengespeicherte HTML-Fragmente für Card-Raster.
+
+Das HTML eines Rasters hängt nur von den angezeigten Serien, dem Layout
+(Postergröße, Link-Ziel) und dem Suchbegriff ab. `render` baut die
+`<a class="card">`-Fragmente deshalb einmal und merkt sich das Ergebnis
+(LRU) je (Serien-IDs, Layout, Suchbegriff, Seite); wiederholte Aufrufe
+desselben Rasters sind ein Dictionary-Zugriff. Nach einem neuen Commit
+der Indexierung (neue Index-Generation) wird der Cache verworfen.
+"""
+
+import threading
+import urllib.parse as up
+from collections import OrderedDict
+
+import tracing
+from cards import get_card_store
+
+TMDB_PATH = "https://image.tmdb.org/t/p/original"
+TMDB_PATH_SMALL = "https://image.tmdb.org/t/p/w200"
+FRAGMENT_CACHE_SIZE = 512  # gemerkte Raster
+
+# Reihen der Startseite: großes Poster, Serien ohne Poster entfallen
+SHELF = "shelf"
+# Such- und Filterergebnisse: kleines Poster, Link behält Suchbegriff und Seite
+GRID = "grid"
+
+
+def render_card(card, layout: str, q: str = "", page: int | None = None) -> str:
+    href = f"?view=detail&id={card.id}&q={up.quote(q, safe='')}"
+    if page is not None:
+        href += f"&page={page}"
+    base = TMDB_PATH if layout == SHELF else TMDB_PATH_SMALL
+    img_tag = f'<img src="{base + card.poster}" loading="lazy" alt="poster">' if card.poster else ""
+    return f'<a class="card" href="{href}" target="_self">{img_tag}<div class="t">{card.title}</div></a>'
+
+
+_fragments: OrderedDict = OrderedDict()
+_fragments_generation = None
+_fragments_lock = threading.Lock()
+
+
+def render(catalog, ids, layout: str, q: str = "", page: int | None = None, limit: int | None = None) -> tuple[str, ...]:
+    """
+    Card-Fragmente für die Serien `ids` in dieser Reihenfolge.
+
+    Bei `SHELF` werden Serien ohne Poster übersprungen; `limit` begrenzt
+    die Anzahl der gelieferten Cards.
+    """
+    global _fragments_generation
+    store = get_card_store(catalog)
+    ids = tuple(ids)
+    key = (ids, layout, q, page, limit)
+    with _fragments_lock:
+        # Generation des CardStores, aus dem die Fragmente gebaut werden
+        if _fragments_generation != store.generation:
+            _fragments.clear()
+            _fragments_generation = store.generation
+        elif key in _fragments:
+            _fragments.move_to_end(key)
+            tracing.count("fragment_cache_hits")
+            return _fragments[key]
+
+    cards = []
+    with tracing.span("render.cards"):
+        for doc_id in ids:
+            card = store.get(doc_id)
+            if card is None or (layout == SHELF and not card.poster):
+                continue
+            cards.append(render_card(card, layout, q, page))
+            if limit is not None and len(cards) >= limit:
+                break
+    cards = tuple(cards)
+    tracing.count("cards_rendered", len(cards))
+
+    with _fragments_lock:
+        # Inzwischen neu geladen: Fragmente der alten Generation nicht mehr ablegen
+        if _fragments_generation == store.generation:
+            _fragments[key] = cards
+            while len(_fragments) > FRAGMENT_CACHE_SIZE:
+                _fragments.popitem(last=False)
+    return cards
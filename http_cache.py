@@ -0,0 +1,145 @@
+"""
+Persistenter HTTP-Cache für die Anreicherung (Wikipedia + TMDB).
+
+Antworten auf GET-Anfragen werden in einer SQLite-Datei abgelegt, der
+Schlüssel ist die vollständige Anfrage-URL (inkl. Query-Parametern). Der
+Inhalt wird mit zlib komprimiert gespeichert. Einträge verfallen nach
+`ttl` Sekunden; überschreitet der Cache `max_bytes`, werden die am
+längsten nicht genutzten Einträge entfernt.
+
+`CachedSession` ist ein Drop-in-Ersatz für `requests.Session`. Mit
+`offline=True` wird nie das Netzwerk benutzt – fehlende Einträge führen
+dann zu einer `CacheMiss`-Ausnahme. So lässt sich die Indexierung gegen
+einen aufgezeichneten Cache komplett ohne Netzwerk ausführen.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_TTL = 30 * 24 * 3600        # 30 Tage
+DEFAULT_MAX_BYTES = 512 * 1024**2   # 512 MB (komprimiert)
+CACHEABLE_STATUS = {200, 404}       # 404 = "gibt es nicht", lohnt sich ebenfalls
+
+
+class CacheMiss(requests.RequestException):
+    """Im Offline-Modus angefragte URL, die nicht im Cache liegt."""
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> tuple[int, dict, bytes] | None:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, headers, body, created FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[3] > self.ttl):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (now, url))
+            self.conn.commit()
+            self.hits += 1
+        status, headers, body, _ = row
+        return status, json.loads(headers), zlib.decompress(body)
+
+    def put(self, url: str, status: int, headers: dict, content: bytes) -> None:
+        body = zlib.compress(content)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, status, json.dumps(headers), body, len(body), now, now),
+            )
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        # Zuerst abgelaufene Einträge, danach LRU bis auf 90 % des Limits
+        if self.ttl:
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = self.total_bytes - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        doomed = []
+        for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY accessed"):
+            if excess <= 0:
+                break
+            doomed.append((url,))
+            excess -= size
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE url = ?", doomed)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class CachedSession(requests.Session):
+    """`requests.Session`, die GET-Antworten über einen `ResponseCache` bedient."""
+
+    def __init__(self, cache: ResponseCache | None, offline: bool = False):
+        super().__init__()
+        self.cache = cache
+        self.offline = offline
+
+    def send(self, request, **kwargs):
+        if self.cache is None or request.method != "GET":
+            return super().send(request, **kwargs)
+
+        cached = self.cache.get(request.url)
+        if cached is not None:
+            status, headers, content = cached
+            return self._build_response(request, status, headers, content)
+        if self.offline:
+            raise CacheMiss(f"Not in cache: {request.url}", request=request)
+
+        response = super().send(request, **kwargs)
+        if response.status_code in CACHEABLE_STATUS:
+            self.cache.put(request.url, response.status_code, dict(response.headers), response.content)
+        return response
+
+    @staticmethod
+    def _build_response(request, status: int, headers: dict, content: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        # Bereits dekomprimiert gespeichert
+        response.headers.pop("Content-Encoding", None)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
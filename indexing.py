@@ -3,34 +3,120 @@ Dieses Skript liest Seriendaten aus CSV-Dateien, ruft ergänzende
 Informationen von Wikipedia und The Movie Database (TMDB) ab und
 indexiert alles mit Tantivy.
 
-Hauptschritte:
-1) Schema für den Tantivy-Index definieren.
-2) Index-Verzeichnis erstellen und Writer initialisieren.
-3) Wikipedia‑Client mit benutzerdefiniertem User‑Agent aufsetzen.
-4) CSV‑Daten (Serien + IMDb) einlesen und mergen.
-5) Für jede Serie: Wikipedia-Seite laden, TMDB-Daten per API ergänzen,
-   Dokument zusammenstellen und in den Index schreiben.
-6) Änderungen committen und Merge-Threads abwarten.
+Der Lauf besteht aus zwei Stufen, die auch einzeln ausgeführt werden
+können (--stage):
+
+enrich – Daten sammeln:
+1) HTTP-Sessions (Wikipedia + TMDB) mit Verbindungspool, Rate-Limit je
+   Host, Timeouts, Wiederholungen mit Backoff und persistentem
+   Antwort-Cache aufsetzen.
+2) Seriendaten (CSV oder NDJSON) blockweise einlesen, über einen
+   Hash-Index der IMDb-IDs (Schlüssel 'series') joinen und spaltenweise
+   vorverarbeiten (Wikipedia-Titel, Mehrfachwerte, Zahlen).
+3) Für jede Serie nebenläufig: Wikipedia-Seite laden und TMDB-Daten per
+   API ergänzen (TMDB-ID über die IMDb-ID suchen – entfällt, wenn sie aus
+   einem früheren Lauf bekannt ist –, dann Details samt Videos in einer
+   Anfrage).
+4) Ergebnis als komprimierten Parquet-Snapshot schreiben (snapshot.py);
+   alle N Zeilen wird eine Teil-Datei als Checkpoint gesichert.
+
+index – Index aus dem Snapshot bauen (ohne Netzwerk):
+5) Index-Verzeichnis erstellen und Writer initialisieren (Heap-Größe und
+   Thread-Anzahl einstellbar; jeder Writer-Thread schreibt eigene
+   Segmente). Schema aus catalog.py.
+6) Snapshot speichergemappt lesen, Dokumente (inkl. Facetten für Orte,
+   Länder und Genres) aufbauen und schreiben. Parallel arbeiten die
+   Writer-Threads (--index-threads); der Aufbau selbst ist billiger als
+   das Hin- und Herschicken der Dokumente an andere Prozesse.
+7) Committen, Merges abwarten, nicht mehr benötigte Segmentdateien
+   aufräumen und die Segmentanzahl ausgeben; danach die Reihen der
+   Startseite als Sidecar-Datei ablegen (shelves.py).
+
+Mit --incremental werden nur neue oder geänderte Zeilen (Inhalts-Hash je
+Zeile) neu angereichert bzw. indexiert, entfernte Zeilen gelöscht und
+eine abgebrochene Anreicherung an der letzten Checkpoint-Stelle
+fortgesetzt. Zeilen, deren TMDB-Abfrage fehlgeschlagen ist (`tmdb_error`
+im Snapshot), werden dabei erneut angereichert. Ohne den Schalter werden Snapshot und Index komplett neu
+aufgebaut.
+
+Aufruf:
+    python indexing.py [--stage all|enrich|index] [--snapshot serien_snapshot.parquet]
+                       [--series series.csv] [--imdb imdb.csv] [--chunk-size 50000]
+                       [--limit 300] [--workers 8] [--max-in-flight 32]
+                       [--cache .http_cache.sqlite] [--no-cache] [--offline]
+                       [--incremental] [--checkpoint-every 100]
+                       [--heap-size 128000000] [--index-threads 0]
 """
 
+import argparse
 import pandas as pd
 import wikipediaapi
-import re
-from urllib.parse import urlparse, unquote
-from tantivy import Facet, SchemaBuilder, Index, Document
+from urllib.parse import unquote
+from tantivy import Facet, Index, Document
 import pathlib
 import json
 import requests
 import os
-from itertools import islice
+import time
 from dotenv import load_dotenv
 import trailer
+import filters
+import snapshot
+import shelves
+from catalog import schema, INDEX_PATH, rating_bucket
+from enrichment import HostRateLimiter, RequestStats, ThrottledAdapter, enrich_concurrently
+from http_cache import CachedSession, ResponseCache, DEFAULT_TTL
+
+
+# Basis-URLs für TMDB-Requests (TMDB_BASE_URL z. B. für einen lokalen Stub-Server)
+TMDB_BASE = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3").rstrip("/")
+TMDB_API = TMDB_BASE + "/find/"
+TMDB_TV_API = TMDB_BASE + "/tv/"
+SOURCE = "?external_source=imdb_id"  # Parameter, um via IMDb-ID zu suchen
+# Details und Videos (Trailer) einer Serie in einer Anfrage
+TV_DETAILS = "?append_to_response=videos"
+
+SERIES_PATH = "series.csv"
+IMDB_PATH = "imdb.csv"
+ROW_LIMIT = 300  # beschränkt auf die ersten N Einträge – None für alle
+CHUNK_ROWS = 50_000  # Zeilen je eingelesenem Block der Seriendaten
+
+# Spaltentypen fest vorgeben: ein Block ohne Werte in einer Spalte würde sonst
+# anders erkannt (z. B. float statt str) und andere Zeilen-Hashes liefern.
+SERIES_DTYPES = {
+    "series": "str",
+    "seriesLabel": "str",
+    "wikipediaPage": "str",
+    "image": "str",
+    "startTime": "Int64",
+    "follower": "float64",
+    "score": "float64",
+    "locations": "str",
+    "countries": "str",
+    "genres": "str",
+    "maleCreatorsCount": "Int64",
+    "femaleCreatorsCount": "Int64",
+    "otherCreatorsCount": "Int64",
+}
 
+# Nebenläufigkeit & Rate-Limits
+MAX_WORKERS = 8       # Threads, die gleichzeitig Wikipedia/TMDB abfragen
+MAX_IN_FLIGHT = 32    # maximale Anzahl offener Aufträge (laufend + nicht abgeholt)
+HOST_RATES = {        # Anfragen pro Sekunde je Host
+    "en.wikipedia.org": 10,
+    "api.themoviedb.org": 40,
+}
 
-# Basis-URLs für TMDB-Requests
-TMDB_API = "https://api.themoviedb.org/3/find/"
-TMDB_TRAILER_API = "https://api.themoviedb.org/3/tv/"
-SOURCE = "?external_source=imdb_id"  # Parameter, um via IMDb-ID zu suchen
+# Inkrementelle Indexierung (siehe load_state/checkpoint)
+STATE_FILE = "indexing_state.json"  # liegt im Index-Verzeichnis
+CHECKPOINT_EVERY = 100              # Commit nach je N geschriebenen Zeilen
+
+# Persistenter HTTP-Cache (Wikipedia + TMDB), siehe http_cache.py
+CACHE_PATH = ".http_cache.sqlite"
+
+# Index-Aufbau
+WRITER_HEAP = 128_000_000  # Byte, wird auf die Writer-Threads aufgeteilt (min. 15 MB je Thread)
+WRITER_THREADS = 0         # 0 = Tantivy wählt anhand der Kerne
 
 # Umgebungsvariablen laden
 load_dotenv()
@@ -41,212 +127,548 @@ headers = {
     "Authorization": os.getenv('TMDB_API_KEY')
 }
 
-# 1) Schema für den Tantivy-Index definieren.
-# Textfelder
-schema_builder = SchemaBuilder()
-schema_builder.add_text_field("wikidata", stored=True)
-schema_builder.add_text_field("url", stored=True)
-schema_builder.add_text_field("title", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("description", stored=True, tokenizer_name='en_stem')  # Mehrwertiges Textfeld
-schema_builder.add_text_field("image", stored=True)
-schema_builder.add_text_field("locations", stored=True)
-schema_builder.add_text_field("countries", stored=True)
-schema_builder.add_text_field("genres", stored=True)
-schema_builder.add_text_field("tmdb_overview", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("tmdb_poster_path", stored=True)
-schema_builder.add_text_field("trailer", stored=True)
-
-# Integer-Felder
-schema_builder.add_integer_field("id", stored=True, indexed=True)
-schema_builder.add_integer_field("follower", stored=True, fast=True)
-schema_builder.add_integer_field("score", stored=True, fast=True)
-schema_builder.add_integer_field("start", stored=True, fast=True)
-schema_builder.add_integer_field("tmdb_genre_ids", stored=True, indexed=True)
-schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
-
-# Float-Felder
-schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
-schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
-
-# Facet-Felder (für hierarchische Filter/Navigation)
-schema_builder.add_facet_field("facet_locations")
-schema_builder.add_facet_field("facet_countries")
-schema_builder.add_facet_field("facet_genres")
-
-# Schema finalisieren
-schema = schema_builder.build()
-
-# 2) Index-Verzeichnis erstellen und Writer initialisieren.
-index_path = "serien_300"  # Relativer Pfad für das Index-Verzeichnis
-if not os.path.exists(index_path):
-    os.makedirs(index_path)
-    print(f"Der {index_path}-Ordner wurde angelegt.")
-else:
-    print(f"Ordner {index_path} existiert bereits.")
-
-index_path = pathlib.Path(index_path)
-index = Index(schema, path=str(index_path))
-writer = index.writer()  # Writer für Batch-Schreibvorgänge
-
-# 3) Wikipedia‑Client mit benutzerdefiniertem User‑Agent aufsetzen.
+# Schema für den Tantivy-Index: gemeinsam mit den Seiten in catalog.py definiert.
+
+# 5) Index-Verzeichnis erstellen.
+def open_index(index_path: str = INDEX_PATH) -> Index:
+    if not os.path.exists(index_path):
+        os.makedirs(index_path)
+        print(f"Der {index_path}-Ordner wurde angelegt.")
+    else:
+        print(f"Ordner {index_path} existiert bereits.")
+    return Index(schema, path=str(pathlib.Path(index_path)))
+
+
+# 1) HTTP-Sessions mit Rate-Limit je Host (und optionalem Cache) aufsetzen.
 custom_user_agent = "MyWikipediaBot/1.0 (https://example.com; myemail@example.com)"
-session = requests.Session()
-session.headers.update({'User-Agent': custom_user_agent})
-
-# Wikipedia-API-Objekt
-wiki = wikipediaapi.Wikipedia(language='en', user_agent=custom_user_agent)
-wiki.session = session
-
-# 4) CSV‑Daten (Serien + IMDb) einlesen und mergen.
-file_path = 'series.csv'
-imdb_path = "imdb.csv"
-
-data_incomplete = pd.read_csv(file_path)
-imdb = pd.read_csv(imdb_path)
-
-# DataFrames anhand der Spalte 'series' zusammenführen (inner join)
-data = pd.merge(data_incomplete, imdb, on='series', how='inner')
-df = pd.DataFrame(data)  # optional: falls weitere Pandas-Operationen geplant sind
-
-# NEU: genres und countries Listen
-# all_genres_set = set()
-# all_countries_set = set()
-
-
-# 5) Für jede Serie: Wikipedia-Seite laden, TMDB-Daten per API ergänzen,
-# Dokument zusammenstellen und in den Index schreiben.
-# islice(..., 10) beschränkt auf die ersten 10 Einträge – bei Bedarf anpassen/entfernen
-for index, row in islice(data.iterrows(), 300):
-#for index, row in data.iterrows():
-    # Wikipedia-Titel aus der URL extrahieren und decodieren
-    path = urlparse(row["wikipediaPage"]).path
-    title_encoded = path.split("/")[-1]
-    title = unquote(title_encoded).replace("_", " ")
-    # Klammern (inkl. Inhalt) entfernen, um robustere Titel zu erhalten
-    clean_title = re.sub(r"\s*\(.*?\)", "", title).strip()
-
-    # Wikipedia-Seite abrufen
-    page = wiki.page(title)
-    if page.exists():
-        print(index)
-        try:
-            # Neues Tantivy-Dokument
-            doc = Document()
-
-            # Pflicht-/Basisfelder
-            doc.add_integer("id", index)
-            doc.add_text("wikidata", row["series"])  # Serien-ID/Name aus den CSVs
-            doc.add_text("url", row["wikipediaPage"])  # Wikipedia-URL
-            doc.add_text("title", row["seriesLabel"])  # Anzeigename/Titel
-            doc.add_text("description", page.summary)   # Wikipedia-Zusammenfassung
-
-            # Optionale numerische Felder, nur wenn Werte vorhanden sind
-            if pd.notna(row["follower"]):
-                doc.add_integer("follower", int(row["follower"]))
-            if pd.notna(row["score"]):
-                doc.add_integer("score", int(row["score"]))
-
-            # Optionales Bild (z. B. aus Wikidata/CSV)
-            if pd.notna(row["image"]) and row["image"].strip() != "":
-                doc.add_text("image", row["image"])
-
-            # Startjahr/Startzeit (als Integer gespeichert)
-            doc.add_integer("start", int(row["startTime"]))
-
-            # Mehrwertige Felder + Facets für Filterung (Orte, Länder, Genres)
-            if pd.notna(row["locations"]):
-                for location in str(row["locations"]).split(", "):
-                    doc.add_text("locations", location)
-                    doc.add_facet("facet_locations", Facet.from_string(f"/{location.strip().strip('/')}"))
-
-            if pd.notna(row["countries"]):
-                for country in str(row["countries"]).split(", "):
-                    # country_clean = country.strip()
-                    doc.add_text("countries", country)
-                    doc.add_facet("facet_countries", Facet.from_string(f"/{country.strip().strip('/')}"))
-                    # all_countries_set.add(country_clean)
-
-            if pd.notna(row["genres"]):
-                for genre in str(row["genres"]).split(", "):
-                    # genre_clean = genre.strip()
-                    doc.add_text("genres", genre)
-                    doc.add_facet("facet_genres", Facet.from_string(f"/{genre.strip().strip('/')}"))
-                    # all_genres_set.add(genre_clean)
-
-            # TMDB-Abfragen (auf Basis der IMDb-ID)
-            try:
-                response = requests.get(TMDB_API + row["imdb"] + SOURCE, headers=headers)
-                tmdb_json = json.loads(response.text)
-
-                # Prüfen, ob TV-Ergebnisse vorhanden sind (es wird das erste Ergebnis genommen)
-                if tmdb_json.get("tv_results"):
-                    tmdb = tmdb_json["tv_results"][0]
-
-                    # Optional: Inhaltsangabe/Overview
-                    if tmdb.get("overview"):
-                        tmdb_overview = tmdb.get("overview")
-                        doc.add_text("tmdb_overview", tmdb_overview)
-
-                    # Optional: Posterpfad
-                    if tmdb.get("poster_path"):
-                        tmdb_poster_path = tmdb.get("poster_path")
-                        doc.add_text("tmdb_poster_path", tmdb_poster_path)
-
-                    # Optional: Genre-IDs (mehrwertig als Integers)
-                    if tmdb.get("genre_ids"):
-                        for genre in tmdb.get("genre_ids"):
-                            doc.add_integer("tmdb_genre_ids", genre)
-
-                    # Popularität & Bewertungen (Floats/Integers)
-                    if tmdb.get("popularity"):
-                        tmdb_popularity = tmdb.get("popularity")
-                        doc.add_float("tmdb_popularity", tmdb_popularity)
-                    if tmdb.get("vote_average"):
-                        tmdb_vote_average = tmdb.get("vote_average")
-                        doc.add_float("tmdb_vote_average", tmdb_vote_average)
-                    if tmdb.get("vote_count"):
-                        tmdb_vote_count = tmdb.get("vote_count")
-                        doc.add_integer("tmdb_vote_count", tmdb_vote_count)
-
-                    # Trailer-Key über zusätzliche TMDB-API (Videos) ermitteln
-                        # Trailer-Key über zusätzliche TMDB-API (Videos) ermitteln
-                    video_response = requests.get(
-                        TMDB_TRAILER_API + str(tmdb.get("id", "")) + "/videos", headers=headers
-                    )
-                    key = trailer.get_key(video_response.text)
-                    if isinstance(key, str):
-                        doc.add_text("trailer", key)
+limiter = HostRateLimiter(HOST_RATES)
+request_stats = RequestStats()  # Latenzen und Fehler je Endpunkt
+wiki = None
+tmdb_session = None
 
-                else:
-                    print("No TV results found.")
-            except Exception as e:
-                # Fehler in der TMDB-Abfrage protokollieren, Indexierung dennoch fortsetzen
-                print("TMDB Error")
 
-            # Fertiges Dokument in den Index schreiben
-            writer.add_document(doc)
+def make_session(cache: ResponseCache | None = None, offline: bool = False,
+                 pool_size: int = MAX_WORKERS) -> requests.Session:
+    # Ein gemeinsamer Verbindungspool je Session, gedrosselt pro Host.
+    # Cache-Treffer werden vor dem Adapter beantwortet und zählen nicht gegen das Limit.
+    # Wiederholungen (429/5xx, Verbindungsfehler) übernimmt der Adapter.
+    session = CachedSession(cache, offline=offline)
+    adapter = ThrottledAdapter(limiter, request_stats, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-        except Exception as e:
-            # Falls etwas schiefgeht: überspringen, aber Fehlermeldung ausgeben
-            print(f"{e} Something went wrong. Skipping series")
 
+def setup_clients(cache: ResponseCache | None = None, offline: bool = False,
+                  pool_size: int = MAX_WORKERS) -> None:
+    global wiki, tmdb_session
+
+    session = make_session(cache, offline, pool_size)
+    session.headers.update({'User-Agent': custom_user_agent})
+
+    # Wikipedia-API-Objekt (nutzt intern `_session` für alle Abfragen)
+    wiki = wikipediaapi.Wikipedia(language='en', user_agent=custom_user_agent)
+    wiki._session = session
+
+    # TMDB-Session (teilt sich Limiter und Cache, eigene Header)
+    tmdb_session = make_session(cache, offline, pool_size)
+    tmdb_session.headers.update(headers)
+
+
+# 2) CSV‑Daten (Serien + IMDb) einlesen und mergen.
+def load_data(file_path: str = SERIES_PATH, imdb_path: str = IMDB_PATH) -> pd.DataFrame:
+    data_incomplete = pd.read_csv(file_path, dtype=SERIES_DTYPES)
+    imdb = pd.read_csv(imdb_path, dtype="str")
+
+    # DataFrames anhand der Spalte 'series' zusammenführen (inner join)
+    return pd.merge(data_incomplete, imdb, on='series', how='inner')
+
+
+def imdb_index(imdb_path: str = IMDB_PATH, chunk_size: int = CHUNK_ROWS) -> dict[str, list]:
+    # 'series' -> IMDb-IDs in Dateireihenfolge (eine Serie kann mehrere haben)
+    index = {}
+    for chunk in pd.read_csv(imdb_path, dtype="str", chunksize=chunk_size):
+        for series, imdb in zip(chunk["series"], chunk["imdb"]):
+            index.setdefault(series, []).append(imdb)
+    return index
+
+
+def read_chunks(file_path: str, chunk_size: int = CHUNK_ROWS):
+    # Wikidata-Exporte als CSV oder NDJSON (ein JSON-Objekt je Zeile)
+    if file_path.endswith((".ndjson", ".jsonl")):
+        reader = pd.read_json(file_path, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+        for chunk in reader:
+            yield chunk.astype({column: dtype for column, dtype in SERIES_DTYPES.items() if column in chunk})
     else:
+        yield from pd.read_csv(file_path, dtype=SERIES_DTYPES, chunksize=chunk_size)
+
+
+def iter_data(file_path: str = SERIES_PATH, imdb_path: str = IMDB_PATH,
+              chunk_size: int = CHUNK_ROWS):
+    """
+    Wie `load_data`, aber blockweise: liefert die gejointen Zeilen in
+    DataFrames von etwa `chunk_size` Zeilen.
+
+    Nur der Hash-Index der IMDb-IDs liegt vollständig im Speicher. Zeilen,
+    Reihenfolge und Index (fortlaufende Zeilennummer) entsprechen dem
+    inner join von `load_data`.
+    """
+    imdb = imdb_index(imdb_path, chunk_size)
+    offset = 0
+    for chunk in read_chunks(file_path, chunk_size):
+        joined = chunk.assign(imdb=chunk["series"].map(imdb)).dropna(subset=["imdb"])
+        joined = joined.explode("imdb").astype({"imdb": "str"})
+        joined.index = pd.RangeIndex(offset, offset + len(joined))
+        offset += len(joined)
+        if len(joined):
+            yield joined
+
+
+def _split_tags(column: pd.Series) -> pd.Series:
+    # "a, b" -> ["a", "b"]; fehlende Werte -> []
+    lists = column.astype("string[pyarrow]").str.split(", ")
+    return lists.map(lambda tags: tags if isinstance(tags, list) else [])
+
+
+def preprocess(data: pd.DataFrame) -> list[dict]:
+    """
+    Alle Zeilen spaltenweise für die Indexierung aufbereiten.
+
+    Liefert je Zeile (in Zeilenreihenfolge) ein einfaches Dict mit den
+    CSV-Feldern des Snapshots: bereinigter Wikipedia-Titel, Listen für
+    Orte/Länder/Genres und Zahlen als int bzw. None statt NaN.
+    """
+    pages = data["wikipediaPage"].astype("string[pyarrow]")
+    # Letztes Pfadsegment der URL, dekodiert, "_" -> " "
+    segments = pages.str.extract(r"^[^?#]*/([^/?#]*)", expand=False).fillna("")
+    decoded = {value: unquote(value) for value in segments.unique()}
+    wiki_titles = segments.map(decoded).str.replace("_", " ", regex=False)
+
+    image = data["image"].astype("string[pyarrow]").str.strip()
+
+    frame = pd.DataFrame({
+        "series": data["series"],
+        "wikipediaPage": data["wikipediaPage"],
+        "seriesLabel": data["seriesLabel"],
+        "imdb": data["imdb"],
+        "wiki_title": wiki_titles,
+        "follower": pd.to_numeric(data["follower"], errors="coerce").astype("Int64"),
+        "score": pd.to_numeric(data["score"], errors="coerce").astype("Int64"),
+        "start": pd.to_numeric(data["startTime"], errors="coerce").astype("Int64"),
+        "image": image.where(image != ""),
+    })
+    # Einheitlich None statt NaN/NA, damit die Dicts picklebar und leicht prüfbar sind
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    frame["locations"] = _split_tags(data["locations"])
+    frame["countries"] = _split_tags(data["countries"])
+    frame["genres"] = _split_tags(data["genres"])
+    return frame.to_dict("records")
+
+
+# Zustand für inkrementelle Läufe: je Zeile Inhalts-Hash und vergebene Dokument-ID.
+# 'series' ist nach dem Join nicht eindeutig (mehrere IMDb-IDs je Serie),
+# deshalb dient das Paar aus Wikidata- und IMDb-ID als Schlüssel.
+def row_keys(data: pd.DataFrame) -> pd.Series:
+    # Fehlende IMDb-IDs als "" – bei String-Spalten bliebe der Schlüssel sonst NaN
+    return data["series"].fillna("").astype(str) + " " + data["imdb"].fillna("").astype(str)
+
+
+def row_hashes(data: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(data, index=False).map("{:016x}".format)
+
+
+def load_state(index_path: str = INDEX_PATH) -> dict:
+    path = os.path.join(index_path, STATE_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"rows": {}}
+
+
+def save_state(state: dict, index_path: str = INDEX_PATH) -> None:
+    # Atomar ersetzen, damit ein Abbruch keine halbe Datei hinterlässt
+    path = os.path.join(index_path, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def checkpoint(writer, state: dict, index_path: str = INDEX_PATH) -> None:
+    # Erst committen, dann den Zustand sichern: bricht der Lauf dazwischen ab,
+    # werden die Zeilen beim nächsten Mal einfach erneut (idempotent) geschrieben.
+    writer.commit()
+    save_state(state, index_path)
+
+
+# Länder und Genres werden als Filtergruppen (genres.json/countries.json) facettiert,
+# damit die Stöbern-Seite direkt im Index filtern kann. Bereits aufgelöste
+# Gruppen (siehe with_groups) können mitgegeben werden.
+def add_tag_fields(doc: Document, locations, countries, genres,
+                   country_groups=None, genre_groups=None) -> None:
+    for location in locations:
+        doc.add_text("locations", location)
+        doc.add_facet("facet_locations", Facet.from_string(f"/{location.strip().strip('/')}"))
+
+    for country in countries:
+        doc.add_text("countries", country)
+    if country_groups is None:
+        country_groups = filters.country_table().resolve(countries)
+    for group in country_groups:
+        doc.add_facet("facet_countries", filters.group_facet(group))
+
+    for genre in genres:
+        doc.add_text("genres", genre)
+    if genre_groups is None:
+        genre_groups = filters.genre_table().resolve(genres)
+    for group in genre_groups:
+        doc.add_facet("facet_genres", filters.group_facet(group))
+
+
+# 3) Für jede Serie: Wikipedia-Seite laden, TMDB-Daten per API ergänzen.
+# Läuft in den Worker-Threads und liefert einen Snapshot-Eintrag (siehe snapshot.py).
+def enrich_row(item) -> tuple[int, dict | None]:
+    index, row = item
+
+    # Wikipedia-Seite abrufen (Titel aus der URL, siehe preprocess)
+    page = wiki.page(row["wiki_title"])
+    if not page.exists():
         # Wikipedia-Seite existiert nicht – Eintrag überspringen
         print(str(index) + " Page does not exist.")
+        return index, None
 
-# 6) Änderungen committen und Merge-Threads abwarten.
-writer.commit()                 # Schreibvorgänge bestätigen
-
-
-# NEU: genres und countries JSON erzeugen
-# with open("genres.json", "w", encoding="utf-8") as f:
-#     json.dump(sorted(list(all_genres_set)), f, ensure_ascii=False, indent=2)
-#
-# with open("countries.json", "w", encoding="utf-8") as f:
-#     json.dump(sorted(list(all_countries_set)), f, ensure_ascii=False, indent=2)
-#
-# print(f"Genres.json erzeugt: {sorted(list(all_genres_set))}")
-# print(f"Countries.json erzeugt: {sorted(list(all_countries_set))}")
+    print(index)
+    try:
+        record = dict(row)
+        record["description"] = page.summary  # Wikipedia-Zusammenfassung
 
+        # TMDB-Abfragen (auf Basis der IMDb-ID)
+        try:
+            tmdb_id = row.get("tmdb_id")
+            if tmdb_id is None and row["imdb"] is not None:
+                response = tmdb_session.get(TMDB_API + row["imdb"] + SOURCE)
+                response.raise_for_status()  # auch nach allen Wiederholungen fehlgeschlagen
+                tv_results = response.json().get("tv_results")
+
+                # Es wird das erste TV-Ergebnis genommen
+                if tv_results:
+                    tmdb_id = tv_results[0].get("id")
+                else:
+                    print("No TV results found.")
 
-writer.wait_merging_threads()   # Hintergrund-Mergeprozesse abwarten
+            if tmdb_id is not None:
+                # Details inkl. Videos (für den Trailer-Key) in einer Anfrage
+                response = tmdb_session.get(TMDB_TV_API + str(tmdb_id) + TV_DETAILS)
+                response.raise_for_status()
+                tmdb = response.json()
+
+                # Optionale Felder; leere Werte werden nicht übernommen
+                record["tmdb_id"] = tmdb_id
+                record["tmdb_overview"] = tmdb.get("overview") or None
+                record["tmdb_poster_path"] = tmdb.get("poster_path") or None
+                record["tmdb_genre_ids"] = [genre["id"] for genre in tmdb.get("genres") or []]
+                record["tmdb_popularity"] = tmdb.get("popularity") or None
+                record["tmdb_vote_average"] = tmdb.get("vote_average") or None
+                record["tmdb_vote_count"] = tmdb.get("vote_count") or None
+                record["tmdb_seasons"] = tmdb.get("number_of_seasons") or None
+                record["tmdb_networks"] = [network["name"] for network in tmdb.get("networks") or []]
+
+                key = trailer.get_key(tmdb)
+                if isinstance(key, str):
+                    record["trailer"] = key
+        except Exception as e:
+            # Fehler in der TMDB-Abfrage protokollieren, Indexierung dennoch fortsetzen;
+            # markierte Zeilen fragt der nächste Lauf mit --incremental erneut ab
+            print(f"TMDB Error ({row['imdb']}): {e!r}")
+            record["tmdb_error"] = True
+
+        return index, record
+
+    except Exception as e:
+        # Falls etwas schiefgeht: überspringen, aber Fehlermeldung ausgeben
+        print(f"{e} Something went wrong. Skipping series")
+        return index, None
+
+
+# 4) Stufe "enrich": neue/geänderte Zeilen anreichern und als Parquet-Snapshot
+# ablegen. Alle N Zeilen wird eine Teil-Datei geschrieben (Checkpoint).
+def enrich_stage(chunks, args) -> None:
+    """
+    Blöcke der gejointen Seriendaten (siehe `iter_data`) anreichern.
+
+    Die Blöcke werden erst gelesen, wenn die Worker Platz für neue Aufträge
+    haben; im Speicher liegen nur der aktuelle Block, die offenen Aufträge
+    und die Zeilenschlüssel (zum Erkennen entfernter Zeilen).
+    """
+    if args.incremental:
+        # Vorhandener Snapshot samt Teil-Dateien eines abgebrochenen Laufs
+        known = snapshot.load_index(args.snapshot)
+    else:
+        snapshot.clear(args.snapshot)
+        known = {}
+
+    seen = set()
+    in_flight = {}
+    unchanged = 0
+    retried = 0  # Zeilen mit fehlgeschlagener TMDB-Abfrage aus einem früheren Lauf
+    complete = False  # Eingabe vollständig gelesen?
+
+    # Nur neue oder geänderte Zeilen anreichern. Bekannte Zeilen behalten ihre ID,
+    # neue bekommen ihre Zeilennummer bzw. die nächste freie ID.
+    def pending_rows():
+        nonlocal unchanged, retried, complete
+        used_ids = {entry["id"] for entry in known.values()}
+        next_id = max(used_ids, default=-1) + 1
+        for data in chunks:
+            keys = row_keys(data)
+            seen.update(keys)
+            if args.limit and data.index[0] >= args.limit:
+                # Entfernte Zeilen werden an der gesamten Datei gemessen, nicht am Limit
+                continue
+            for position, record, key, row_hash in zip(data.index, preprocess(data), keys, row_hashes(data)):
+                if args.limit and position >= args.limit:
+                    break
+                entry = known.get(key)
+                if entry is not None and entry["hash"] == row_hash and not entry["tmdb_error"]:
+                    unchanged += 1
+                    continue
+                if entry is not None:
+                    retried += entry["hash"] == row_hash
+                    row_id = entry["id"]
+                    # Gleicher Schlüssel = gleiche IMDb-ID: die TMDB-Suche entfällt
+                    record = {**record, "tmdb_id": entry.get("tmdb_id")}
+                elif position not in used_ids:
+                    row_id = int(position)
+                else:
+                    while next_id in used_ids:
+                        next_id += 1
+                    row_id = next_id
+                used_ids.add(row_id)
+                in_flight[row_id] = {**record, "key": key, "hash": row_hash, "id": row_id, "skipped": False, "tmdb_error": False}
+                yield row_id, in_flight[row_id]
+        complete = True
+
+    # Fertige Einträge kommen in Fertigstellungsreihenfolge an
+    started = time.perf_counter()
+    buffer = []
+    done = 0
+    part = snapshot.next_part(args.snapshot)  # fortlaufende Nummer der Teil-Dateien
+    try:
+        for row_id, record in enrich_concurrently(pending_rows(), enrich_row, args.workers, args.max_in_flight):
+            row = in_flight.pop(row_id)
+            # Ohne Wikipedia-Seite nur vermerken, damit die Zeile nicht erneut abgefragt wird
+            buffer.append(record if record is not None else {**row, "skipped": True})
+            done += 1
+            if len(buffer) >= args.checkpoint_every:
+                snapshot.write_part(args.snapshot, buffer, part)
+                part += 1
+                buffer = []
+                print(f"Checkpoint: {done} Zeilen gesichert")
+    finally:
+        # Fertige Zeilen auch bei einem Abbruch sichern (Fortsetzung mit --incremental)
+        if buffer:
+            snapshot.write_part(args.snapshot, buffer, part)
+
+    # Nur nach vollständig gelesener Eingabe wissen wir, welche Zeilen entfernt wurden
+    if not complete:
+        raise RuntimeError("Seriendaten wurden nicht vollständig gelesen")
+    elapsed = time.perf_counter() - started
+    removed = known.keys() - seen
+    print(f"{done} neue/geänderte Zeilen (davon {retried} nach TMDB-Fehler erneut), "
+          f"{len(removed)} entfernt, {unchanged} unverändert")
+    print(f"{done} Zeilen in {elapsed:.1f} s angereichert ({done / max(elapsed, 1e-9):.1f} Zeilen/s)")
+    total = snapshot.compact(args.snapshot, keep_keys=seen)
+    print(f"Snapshot: {total} Einträge in {args.snapshot}")
+
+
+# 6) Dokument aus einem Snapshot-Eintrag (ohne Netzwerkzugriffe).
+def build_document(index: int, row: dict) -> Document:
+    # Neues Tantivy-Dokument
+    doc = Document()
+
+    # Pflicht-/Basisfelder
+    doc.add_integer("id", index)
+    doc.add_text("wikidata", row["series"])  # Serien-ID/Name aus den CSVs
+    doc.add_text("url", row["wikipediaPage"])  # Wikipedia-URL
+    doc.add_text("title", row["seriesLabel"])  # Anzeigename/Titel
+    doc.add_text("description", row["description"])  # Wikipedia-Zusammenfassung
+
+    # Optionale numerische Felder, nur wenn Werte vorhanden sind
+    if row["follower"] is not None:
+        doc.add_integer("follower", row["follower"])
+    if row["score"] is not None:
+        doc.add_integer("score", row["score"])
+
+    # Optionales Bild (z. B. aus Wikidata/CSV)
+    if row["image"] is not None:
+        doc.add_text("image", row["image"])
+
+    # Startjahr/Startzeit (als Integer gespeichert)
+    doc.add_integer("start", int(row["start"]))
+
+    # Mehrwertige Felder + Facets für Filterung (Orte, Länder, Genres)
+    add_tag_fields(doc, row["locations"] or [], row["countries"] or [], row["genres"] or [],
+                   row.get("country_groups"), row.get("genre_groups"))
+
+    # TMDB-Felder
+    if row["tmdb_overview"]:
+        doc.add_text("tmdb_overview", row["tmdb_overview"])
+    if row["tmdb_poster_path"]:
+        doc.add_text("tmdb_poster_path", row["tmdb_poster_path"])
+    for genre in row["tmdb_genre_ids"] or []:
+        doc.add_integer("tmdb_genre_ids", genre)
+    if row["tmdb_popularity"]:
+        doc.add_float("tmdb_popularity", row["tmdb_popularity"])
+    if row["tmdb_vote_average"]:
+        doc.add_float("tmdb_vote_average", row["tmdb_vote_average"])
+    if row["tmdb_vote_count"]:
+        doc.add_integer("tmdb_vote_count", row["tmdb_vote_count"])
+    # Bewertungs-Bucket für jedes Dokument (auch "keine Bewertung" = 0)
+    doc.add_integer("rating_bucket", rating_bucket(row["tmdb_vote_average"]))
+    if row["trailer"]:
+        doc.add_text("trailer", row["trailer"])
+    return doc
+
+
+def build_documents(rows):
+    """(index, Dokument) je (index, Snapshot-Eintrag), in Eingabereihenfolge; None bei Fehlern."""
+    for index, row in rows:
+        try:
+            yield index, build_document(index, row)
+        except Exception as e:
+            print(f"{e} Something went wrong. Skipping series")
+            yield index, None
+
+
+def with_groups(rows):
+    # Filtergruppen je unterschiedlicher Tag-Liste nur einmal auflösen
+    # (aktueller Stand von genres.json/countries.json, nicht aus dem Snapshot)
+    countries, genres = filters.country_table(), filters.genre_table()
+    resolved = {}
+    for row in rows:
+        for field, table in (("countries", countries), ("genres", genres)):
+            tags = tuple(row[field] or ())
+            if (field, tags) not in resolved:
+                resolved[field, tags] = table.resolve(tags)
+        row["country_groups"] = resolved["countries", tuple(row["countries"] or ())]
+        row["genre_groups"] = resolved["genres", tuple(row["genres"] or ())]
+        yield row
+
+
+# Stufe "index": Index aus dem Snapshot aufbauen (offline). Inkrementell
+# werden nur Einträge geschrieben, deren Hash/ID vom Index-Zustand abweicht.
+def index_stage(args, index_path: str = INDEX_PATH) -> tuple[int, int]:
+    index = open_index(index_path)
+    # Writer für Batch-Schreibvorgänge; jeder Thread erzeugt eigene Segmente
+    writer = index.writer(args.heap_size, args.index_threads)
+
+    if args.incremental:
+        state = load_state(index_path)
+    else:
+        # Vollständiger Neuaufbau: vorhandene Dokumente verwerfen
+        writer.delete_all_documents()
+        state = {"rows": {}}
+    known = state["rows"]
+
+    # Nur Verwaltungsspalten lesen, um Änderungen zu bestimmen. Der TMDB-Fehler zählt mit,
+    # damit eine erfolgreich wiederholte Zeile neu geschrieben wird (nur gesetzt, wenn wahr)
+    entries = {
+        key: {"hash": row_hash, "id": row_id, **({"tmdb_error": True} if tmdb_error else {})}
+        for key, row_hash, row_id, tmdb_error in snapshot.read_columns(
+            args.snapshot, ["key", "hash", "id", "tmdb_error"])
+    }
+    removed = known.keys() - entries.keys()
+    for key in removed:
+        writer.delete_documents("id", known.pop(key)["id"])
+    changed = {key for key, entry in entries.items() if known.get(key) != entry}
+    print(f"{len(changed)} Einträge zu schreiben, {len(removed)} entfernt")
+
+    # Alte Versionen (falls vorhanden) vor dem Schreiben löschen
+    for key in changed:
+        writer.delete_documents("id", entries[key]["id"])
+        if key in known and known[key]["id"] != entries[key]["id"]:
+            writer.delete_documents("id", known[key]["id"])
+
+    rows = (row for row in snapshot.iter_rows(args.snapshot) if row["key"] in changed)
+    items = ((row["id"], row) for row in with_groups(rows) if not row["skipped"])
+
+    started = time.perf_counter()
+    written = 0
+    for row_id, doc in build_documents(items):
+        if doc is not None:
+            writer.add_document(doc)
+            written += 1
+    known.update((key, entries[key]) for key in changed)
+
+    # Änderungen committen und Zustand sichern
+    checkpoint(writer, state, index_path)
+    elapsed = time.perf_counter() - started
+    print(f"{written} Dokumente in {elapsed:.1f} s ({written / max(elapsed, 1e-9):.1f} Dokumente/s)")
+
+    # 7) Merges abwarten und aufräumen
+    segments = finalize_index(index, writer, args.heap_size)
+    print(f"Index: {segments} Segment(e)")
+
+    # Reihen der Startseite für den neuen Stand ablegen
+    shelves.write(index_path, index.searcher())
+    return written, segments
+
+
+# 7) Abschließender Merge-Schritt. Die Python-Bindings bieten keinen expliziten
+# Merge-Aufruf; die Standard-Merge-Policy von Tantivy fasst Segmente nach jedem
+# Commit im Hintergrund zusammen. Hier werden diese Merges abgewartet und die
+# dadurch überflüssigen Segmentdateien entfernt.
+def finalize_index(index: Index, writer, heap_size: int = WRITER_HEAP) -> int:
+    writer.wait_merging_threads()
+    cleanup = index.writer(heap_size, 1)
+    cleanup.garbage_collect_files()
+    cleanup.wait_merging_threads()
+    index.reload()
+    return index.searcher().num_segments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serien anreichern und mit Tantivy indexieren.")
+    parser.add_argument("--stage", choices=["all", "enrich", "index"], default="all",
+                        help="nur anreichern (Snapshot schreiben), nur indexieren oder beides")
+    parser.add_argument("--snapshot", default=snapshot.SNAPSHOT_PATH, help="Pfad des Parquet-Snapshots")
+    parser.add_argument("--series", default=SERIES_PATH,
+                        help="Seriendaten als CSV oder NDJSON (.ndjson/.jsonl)")
+    parser.add_argument("--imdb", default=IMDB_PATH, help="CSV mit den Spalten series, imdb")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS,
+                        help="Zeilen je eingelesenem Block der Seriendaten")
+    parser.add_argument("--limit", type=int, default=ROW_LIMIT, help="nur die ersten N Zeilen (0 = alle)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Anzahl paralleler Abfrage-Threads")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="maximale Anzahl gleichzeitig offener Aufträge")
+    parser.add_argument("--cache", default=CACHE_PATH, help="Pfad der HTTP-Cache-Datei")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="Gültigkeit in Sekunden")
+    parser.add_argument("--no-cache", action="store_true", help="HTTP-Cache deaktivieren")
+    parser.add_argument("--offline", action="store_true",
+                        help="nur aus dem Cache lesen, keine Netzwerkzugriffe")
+    parser.add_argument("--incremental", action="store_true",
+                        help="nur neue/geänderte Zeilen verarbeiten, abgebrochene Läufe fortsetzen")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help="Snapshot-Checkpoint nach je N angereicherten Zeilen")
+    parser.add_argument("--heap-size", type=int, default=WRITER_HEAP,
+                        help="Speicherbudget des Writers in Byte (für alle Threads zusammen)")
+    parser.add_argument("--index-threads", type=int, default=WRITER_THREADS,
+                        help="Writer-Threads (0 = automatisch)")
+    args = parser.parse_args()
+
+    if args.stage in ("all", "enrich"):
+        cache = None if args.no_cache else ResponseCache(args.cache, ttl=args.cache_ttl)
+        setup_clients(cache, offline=args.offline, pool_size=args.workers)
+        enrich_stage(iter_data(args.series, args.imdb, args.chunk_size), args)
+        if cache is not None:
+            print(f"HTTP-Cache: {cache.hits} Treffer, {cache.misses} Fehlschläge")
+            cache.close()
+        for name, entry in request_stats.summary().items():
+            print(f"HTTP {name}: {json.dumps(entry)}")
+
+    if args.stage in ("all", "index"):
+        index_stage(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,10 @@
-from tantivy import Index, Facet, Query, Occur, SchemaBuilder, FieldType
+from tantivy import Index, Query, Occur, FieldType
+from catalog import INDEX_PATH, schema
+from filters import group_facet
 
-schema_builder = SchemaBuilder()
-# Text-Felder
-schema_builder.add_text_field("wikidata", stored=True)
-schema_builder.add_text_field("url", stored=True)
-schema_builder.add_text_field("title", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("description", stored=True, tokenizer_name='en_stem')  # Multi-valued text field
-schema_builder.add_text_field("image", stored=True)
-schema_builder.add_text_field("locations", stored=True)
-schema_builder.add_text_field("countries", stored=True)
-schema_builder.add_text_field("genres", stored=True)
-schema_builder.add_text_field("tmdb_overview", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("tmdb_poster_path", stored=True)
-schema_builder.add_text_field("trailer", stored=True)
 
-# Integer-Felder
-schema_builder.add_integer_field("id", stored=True, indexed=True)
-schema_builder.add_integer_field("follower", stored=True, fast=True)
-schema_builder.add_integer_field("score", stored=True, fast=True)
-schema_builder.add_integer_field("start", stored=True, fast=True)
-schema_builder.add_integer_field("tmdb_genre_ids", stored=True, indexed=True)
-schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
-
-# Float-Felder
-schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
-schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
-
-# Facetten-Felder
-schema_builder.add_facet_field("facet_locations")
-schema_builder.add_facet_field("facet_countries")
-schema_builder.add_facet_field("facet_genres")
-
-schema = schema_builder.build()
-index_path = "neu"
+# Index mit dem aktuellen Schema (catalog.py); Länder sind als Filtergruppen facettiert
+index_path = INDEX_PATH
 index = Index(schema, path=str(index_path))
 searcher = index.searcher()
 
@@ -43,7 +15,7 @@ searcher = index.searcher()
 text_q = Query.term_query(schema, "title", "crime")
 
 # facet query
-facet_q = Query.term_query(schema, "facet_countries", Facet.from_string("/United States of America"))
+facet_q = Query.term_query(schema, "facet_countries", group_facet("USA"))
 
 # Kombination (MUST = logisches UND)
 q = Query.boolean_query([
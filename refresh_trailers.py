@@ -0,0 +1,188 @@
+"""
+Trailer-Keys im bestehenden Index auffrischen, ohne neu zu crawlen.
+
+YouTube-Keys veralten; ein kompletter Lauf von indexing.py würde dafür
+auch Wikipedia erneut abfragen. Dieses Skript
+1) geht alle Dokumente des Index nach `id` durch und ermittelt die
+   TMDB-ID aus dem Parquet-Snapshot (snapshot.py). Fehlt sie dort – oder
+   gibt es gar keinen Snapshot –, wird sie einmalig über die IMDb-ID
+   gesucht; die IMDb-ID kommt dann aus dem Snapshot oder über das
+   gespeicherte Feld `wikidata` aus imdb.csv,
+2) lädt nebenläufig nur `/tv/{id}/videos` (über dieselben gedrosselten
+   und gecachten Sessions wie indexing.py) und wählt mit
+   `trailer.get_key` den Trailer,
+3) ersetzt nur die Dokumente mit geändertem Key (delete + add aus den
+   gespeicherten Feldern, Facetten und Bewertungs-Bucket neu berechnet) in einem Commit und
+   übernimmt die Keys in den Snapshot.
+
+Fehlgeschlagene Abfragen lassen das Dokument unverändert. Findet TMDB
+keinen Trailer mehr, wird der alte Key entfernt.
+
+Aufruf:
+    python refresh_trailers.py [--index serien_300] [--snapshot serien_snapshot.parquet]
+                               [--imdb imdb.csv]
+                               [--workers 8] [--max-in-flight 32]
+                               [--cache .http_cache.sqlite] [--cache-ttl 86400]
+                               [--no-cache] [--offline] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import time
+
+from tantivy import Document, Index, Query
+
+import indexing
+import shelves
+import snapshot
+import trailer
+from catalog import INDEX_PATH, rating_bucket, schema
+from enrichment import enrich_concurrently
+from http_cache import ResponseCache
+
+REFRESH_TTL = 24 * 3600  # gecachte /videos-Antworten gelten einen Tag als aktuell
+TAG_FIELDS = ("locations", "countries", "genres")  # werden samt Facetten neu aufgebaut
+
+
+def tmdb_ids(snapshot_path: str) -> dict[int, tuple]:
+    # Dokument-ID -> (IMDb-ID, TMDB-ID) aus dem Snapshot
+    if not os.path.exists(snapshot_path):
+        return {}
+    return {
+        row_id: (imdb, tmdb_id)
+        for row_id, imdb, tmdb_id, skipped in snapshot.read_columns(
+            snapshot_path, ["id", "imdb", "tmdb_id", "skipped"])
+        if not skipped
+    }
+
+
+def lookup_items(documents: dict[int, dict], known: dict[int, tuple], imdb_path: str) -> list[tuple]:
+    # (Dokument-ID, IMDb-ID, TMDB-ID) je Dokument; ohne Snapshot-Eintrag IMDb-ID über `wikidata`
+    imdb_ids = None
+    items = []
+    for doc_id in sorted(documents):
+        imdb, tmdb_id = known.get(doc_id, (None, None))
+        if tmdb_id is None and not imdb:
+            if imdb_ids is None:
+                imdb_ids = indexing.imdb_index(imdb_path) if os.path.exists(imdb_path) else {}
+            series = documents[doc_id].get("wikidata", [None])[0]
+            imdb = next((i for i in imdb_ids.get(series, []) if isinstance(i, str)), None)
+        if tmdb_id is not None or imdb:
+            items.append((doc_id, imdb, tmdb_id))
+    return items
+
+
+def fetch_trailer(item) -> tuple[int, int, str | None]:
+    # Läuft in den Worker-Threads; Fehler werden von enrich_concurrently protokolliert
+    doc_id, imdb, tmdb_id = item
+    if tmdb_id is None:
+        response = indexing.tmdb_session.get(indexing.TMDB_API + imdb + indexing.SOURCE)
+        response.raise_for_status()
+        tv_results = response.json().get("tv_results")
+        if not tv_results:
+            raise LookupError(f"keine TMDB-Serie zu {imdb}")
+        tmdb_id = tv_results[0]["id"]
+    response = indexing.tmdb_session.get(indexing.TMDB_TV_API + str(tmdb_id) + "/videos")
+    response.raise_for_status()
+    return doc_id, tmdb_id, trailer.get_key(response.content)
+
+
+def stored_document(stored: dict, key: str | None) -> Document:
+    # Gespeicherte Felder übernehmen, Trailer ersetzen, Tag-Felder und Facetten neu aufbauen
+    doc = Document()
+    for field, values in stored.items():
+        if field == "trailer" or field in TAG_FIELDS:
+            continue
+        for value in values:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                doc.add_text(field, value)
+            elif isinstance(value, int):
+                doc.add_integer(field, value)
+            else:
+                doc.add_float(field, value)
+    if key is not None:
+        doc.add_text("trailer", key)
+    # Nicht gespeichert, deshalb aus der Bewertung neu berechnet
+    doc.add_integer("rating_bucket", rating_bucket(stored.get("tmdb_vote_average", [None])[0]))
+    indexing.add_tag_fields(doc, *(stored.get(field, []) for field in TAG_FIELDS))
+    return doc
+
+
+def update_snapshot(snapshot_path: str, updates: dict[int, tuple]) -> None:
+    rows = []
+    for row in snapshot.iter_rows(snapshot_path):
+        if row["id"] in updates:
+            row["tmdb_id"], row["trailer"] = updates[row["id"]]
+            rows.append(row)
+    if rows:
+        snapshot.write_part(snapshot_path, rows)
+        snapshot.compact(snapshot_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trailer-Keys im Index über TMDB auffrischen.")
+    parser.add_argument("--index", default=INDEX_PATH, help="Index-Verzeichnis")
+    parser.add_argument("--snapshot", default=snapshot.SNAPSHOT_PATH, help="Parquet-Snapshot mit den TMDB-IDs")
+    parser.add_argument("--imdb", default=indexing.IMDB_PATH, help="IMDb-Zuordnung, falls der Snapshot fehlt")
+    parser.add_argument("--workers", type=int, default=indexing.MAX_WORKERS, help="Anzahl paralleler Abfrage-Threads")
+    parser.add_argument("--max-in-flight", type=int, default=indexing.MAX_IN_FLIGHT,
+                        help="maximale Anzahl gleichzeitig offener Aufträge")
+    parser.add_argument("--cache", default=indexing.CACHE_PATH, help="Pfad der HTTP-Cache-Datei")
+    parser.add_argument("--cache-ttl", type=float, default=REFRESH_TTL, help="Gültigkeit in Sekunden")
+    parser.add_argument("--no-cache", action="store_true", help="HTTP-Cache deaktivieren")
+    parser.add_argument("--offline", action="store_true", help="nur aus dem Cache lesen, keine Netzwerkzugriffe")
+    parser.add_argument("--dry-run", action="store_true", help="nur zählen, nichts schreiben")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else ResponseCache(args.cache, ttl=args.cache_ttl)
+    indexing.setup_clients(cache, offline=args.offline, pool_size=args.workers)
+
+    index = Index(schema, path=args.index)
+    searcher = index.searcher()
+    hits = searcher.search(Query.all_query(), limit=max(searcher.num_docs, 1)).hits
+    documents = {}
+    for _, address in hits:
+        stored = searcher.doc(address).to_dict()
+        documents[stored["id"][0]] = stored
+
+    if not os.path.exists(args.snapshot):
+        print(f"Kein Snapshot unter {args.snapshot}, IMDb-IDs kommen aus {args.imdb}")
+    items = lookup_items(documents, tmdb_ids(args.snapshot), args.imdb)
+    print(f"{len(documents)} Dokumente, {len(items)} mit TMDB- bzw. IMDb-ID")
+    if not items:
+        print("Warnung: keine Serie mit TMDB- oder IMDb-ID gefunden, nichts aufzufrischen")
+
+    started = time.perf_counter()
+    checked = 0
+    updates = {}
+    for doc_id, tmdb_id, key in enrich_concurrently(items, fetch_trailer, args.workers, args.max_in_flight):
+        checked += 1
+        current = documents[doc_id].get("trailer", [None])[0]
+        if key != current:
+            updates[doc_id] = (tmdb_id, key)
+    elapsed = time.perf_counter() - started
+    print(f"{checked} Serien in {elapsed:.1f} s geprüft ({checked / max(elapsed, 1e-9):.1f} Serien/s), "
+          f"{len(items) - checked} fehlgeschlagen, {len(updates)} Trailer geändert")
+
+    if updates and not args.dry_run:
+        writer = index.writer(indexing.WRITER_HEAP, 1)
+        for doc_id, (_, key) in updates.items():
+            writer.delete_documents("id", doc_id)
+            writer.add_document(stored_document(documents[doc_id], key))
+        writer.commit()
+        indexing.finalize_index(index, writer)
+        shelves.write(args.index, index.searcher())
+        if os.path.exists(args.snapshot):
+            update_snapshot(args.snapshot, updates)
+        print(f"{len(updates)} Dokumente aktualisiert")
+
+    if cache is not None:
+        print(f"HTTP-Cache: {cache.hits} Treffer, {cache.misses} Fehlschläge")
+        cache.close()
+    for name, entry in indexing.request_stats.summary().items():
+        print(f"HTTP {name}: {json.dumps(entry)}")
+
+
+if __name__ == "__main__":
+    main()
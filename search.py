@@ -0,0 +1,212 @@
+"""
+Such- und Filterabfragen für die Stöbern-Seite.
+
+Suchbegriffe werden einmal über Titel, Inhaltsangabe und Beschreibung
+(mit Feld-Gewichtung) geparst; das Ergebnis wird je normalisiertem
+Suchbegriff zwischengespeichert.
+
+Alle Filter (Genres, Länder, Bewertungen) werden als Tantivy-Abfragen
+formuliert und im Index ausgewertet. `facet_counts` liefert zusätzlich
+die Trefferzahlen je Filter-Checkbox über Aggregationen – ein Durchlauf
+je Filterart statt einer Abfrage je Checkbox – und merkt sich das
+Ergebnis je (Suchbegriff, Filterauswahl) und Index-Generation.
+"""
+
+import functools
+import math
+import threading
+import urllib.parse as up
+from collections import OrderedDict
+
+from tantivy import FieldType, Occur, Query
+
+import filters
+import tracing
+from catalog import schema
+
+# Bewertungsfilter auf der 5-Sterne-Skala als [min, max)
+RATING_OPTIONS = [
+    (4.5, 5.01),  # 5 Sterne
+    (3.5, 4.5),  # 4 Sterne
+    (2.5, 3.5),  # 3 Sterne
+    (1.5, 2.5),  # 2 Sterne
+    (0.5, 1.5),  # 1 Stern
+    (0.0, 0.5)  # Keine Bewertung oder 0 Sterne
+]
+
+COUNT_CACHE_SIZE = 256  # gemerkte (Suchbegriff, Filterauswahl)-Kombinationen
+PARSE_CACHE_SIZE = 1024  # gemerkte geparste Suchbegriffe
+PAGE_SIZE = 30  # Cards je Ergebnisseite
+
+# Volltextsuche über Titel, TMDB-Inhaltsangabe und Wikipedia-Zusammenfassung;
+# ein Treffer im Titel zählt am meisten.
+SEARCH_FIELDS = ["title", "tmdb_overview", "description"]
+FIELD_BOOSTS = {"title": 3.0, "tmdb_overview": 1.5, "description": 1.0}
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(up.unquote(q).lower().split())
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(index, normalized: str):
+    # Jeder Begriff muss vorkommen (+), darf aber in einem beliebigen der Felder
+    # stehen. Als Phrase maskiert, damit Eingaben wie "c:d" oder "(" keine
+    # Query-Syntax auslösen.
+    escaped = (term.replace("\\", "\\\\").replace('"', '\\"') for term in normalized.split())
+    query_string = " ".join(f'+"{term}"' for term in escaped)
+    query, _errors = index.parse_query_lenient(query_string, SEARCH_FIELDS, field_boosts=FIELD_BOOSTS)
+    return query
+
+
+def text_query(index, q: str):
+    # Wird einmal je normalisiertem Suchbegriff geparst und danach wiederverwendet
+    normalized = normalize_query(q)
+    if not normalized:
+        return None
+    return _parse(index, normalized)
+
+
+def paginate(searcher, query, page: int = 0, page_size: int = PAGE_SIZE):
+    """
+    Eine Seite Treffer (score, DocAddress), die Gesamtanzahl und die
+    tatsächlich gelieferte Seite.
+
+    Tantivy sortiert nach Score und bei Gleichstand nach Dokument-Adresse –
+    innerhalb einer Index-Generation also stabil über alle Seiten hinweg.
+    Liegt `page` hinter dem Ende (z. B. nach einer Filteränderung), wird die
+    letzte Seite geliefert.
+    """
+    page = max(0, page)
+    with tracing.span("search.paginate"):
+        result = searcher.search(query, page_size, offset=page * page_size)
+        if not result.hits and result.count and page > 0:
+            page = (result.count - 1) // page_size
+            result = searcher.search(query, page_size, offset=page * page_size)
+    tracing.count("hits", len(result.hits))
+    return result.hits, result.count, page
+
+
+def page_cards(store, hits):
+    # Cards der Treffer aus dem CardStore, ohne den Docstore zu lesen. Die Reihenfolge
+    # bleibt die von Tantivy (Score, bei Gleichstand Dokument-Adresse, siehe `paginate`):
+    # nur sie ist über die Seitengrenzen hinweg konsistent, eine Umsortierung innerhalb
+    # der Seite würde Treffer mit gleichem Score zwischen den Seiten vertauschen.
+    cards = [(score, store.by_address(addr)) for score, addr in hits]
+    return [(score, card) for score, card in cards if card is not None]
+
+
+def search(catalog, q: str, page: int = 0, page_size: int = PAGE_SIZE, searcher=None):
+    """
+    BM25-Treffer einer Seite für einen Suchbegriff, siehe `paginate`.
+
+    Werden die Treffer über `CardStore.by_address` aufgelöst, muss
+    `searcher` der des CardStores sein; ohne Angabe der aktuelle.
+    """
+    query = text_query(catalog.index, q)
+    if query is None:
+        return [], 0, 0
+    return paginate(searcher or catalog.searcher(), query, page, page_size)
+
+
+def rating_buckets(min_r, max_r) -> range:
+    # Filter [min, max) Sterne -> Halbstern-Buckets (siehe catalog.rating_bucket)
+    return range(math.ceil(min_r * 2), math.ceil(max_r * 2))
+
+
+# Die Sterne-Buckets werden beim Indexieren berechnet; Serien ohne Bewertung
+# liegen in Bucket 0 und zählen damit zu "Keine Bewertung".
+def rating_query(min_r, max_r):
+    buckets = rating_buckets(min_r, max_r)
+    if len(buckets) == 1:
+        return Query.term_query(schema, "rating_bucket", buckets[0])
+    return Query.range_query(
+        schema, "rating_bucket", FieldType.Integer, buckets[0], buckets[-1]
+    )
+
+
+def facet_query(field: str, names):
+    return Query.boolean_query([
+        (Occur.Should, Query.term_query(schema, field, filters.group_facet(name)))
+        for name in names
+    ])
+
+
+def filter_query(text, genres, countries, ratings):
+    # Innerhalb einer Filterart ODER, zwischen Suchbegriff und Filterarten UND
+    parts = []
+    if text is not None:
+        parts.append((Occur.Must, text))
+    if genres:
+        parts.append((Occur.Must, facet_query("facet_genres", genres)))
+    if countries:
+        parts.append((Occur.Must, facet_query("facet_countries", countries)))
+    if ratings:
+        parts.append((Occur.Must, Query.boolean_query([
+            (Occur.Should, rating_query(min_r, max_r)) for min_r, max_r in ratings
+        ])))
+    return Query.boolean_query(parts) if parts else Query.all_query()
+
+
+def _aggregations():
+    return {
+        "genres": {"terms": {"field": "facet_genres", "size": len(filters.genre_table().groups) + 1}},
+        "countries": {"terms": {"field": "facet_countries", "size": len(filters.country_table().groups) + 1}},
+        "ratings": {"terms": {"field": "rating_bucket", "size": 11}},
+    }
+
+
+def _count(searcher, query) -> dict:
+    result = searcher.aggregate(query, _aggregations())
+    buckets = {int(b["key"]): b["doc_count"] for b in result["ratings"]["buckets"]}
+    return {
+        "genres": {b["key"]: b["doc_count"] for b in result["genres"]["buckets"]},
+        "countries": {b["key"]: b["doc_count"] for b in result["countries"]["buckets"]},
+        "ratings": {
+            (min_r, max_r): sum(buckets.get(bucket, 0) for bucket in rating_buckets(min_r, max_r))
+            for min_r, max_r in RATING_OPTIONS
+        },
+    }
+
+
+_count_cache: OrderedDict = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+
+def facet_counts(catalog, q: str, genres, countries, ratings) -> dict:
+    """
+    Trefferzahlen je Genre-, Länder- und Bewertungsfilter.
+
+    Die Zahlen einer Filterart berücksichtigen den Suchbegriff und die
+    Auswahl der jeweils *anderen* Filterarten – so zeigt jede Checkbox, wie
+    viele Serien nach dem Anhaken (zusätzlich) im Ergebnis stünden.
+    """
+    genres, countries, ratings = tuple(sorted(genres)), tuple(sorted(countries)), tuple(sorted(ratings))
+    searcher, generation = catalog.current()
+    key = (generation, q, genres, countries, ratings)
+    with _count_cache_lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            tracing.count("facet_cache_hits")
+            return _count_cache[key]
+
+    text = text_query(catalog.index, q) if q else None
+    # Je Filterart die eigene Auswahl weglassen; gleiche Abfragen nur einmal auswerten
+    selections = {
+        "genres": ((), countries, ratings),
+        "countries": (genres, (), ratings),
+        "ratings": (genres, countries, ()),
+    }
+    by_selection: dict = {}
+    counts = {}
+    with tracing.span("search.facet_counts"):
+        for kind, selection in selections.items():
+            if selection not in by_selection:
+                by_selection[selection] = _count(searcher, filter_query(text, *selection))
+            counts[kind] = by_selection[selection][kind]
+
+    with _count_cache_lock:
+        _count_cache[key] = counts
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return counts
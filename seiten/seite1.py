@@ -1,51 +1,26 @@
-import urllib.parse as up
 from typing import Any
 import streamlit as st
-from tantivy import Query, Index, SchemaBuilder, Occur
-import random
 import utils
+import tracing
+import fragments
+import shelves
+from cards import get_card_store
+from catalog import get_catalog
 
 # Konstanten
 TMDB_PATH = "https://image.tmdb.org/t/p/original"
 TMDB_PATH_SMALL = "https://image.tmdb.org/t/p/w200"
-INDEX_PATH = "serien_300"  # bestehendes Tantivy-Index-Verzeichnis
 TOP_K = 20          # wie viele Ergebnisse angezeigt werden sollen
+SHELF_LIMIT = 12    # Cards je Reihe
 
-schema_builder = SchemaBuilder()
-# Text-Felder
-schema_builder.add_text_field("wikidata", stored=True)
-schema_builder.add_text_field("url", stored=True)
-schema_builder.add_text_field("title", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("description", stored=True, tokenizer_name='en_stem')  # Multi-valued text field
-schema_builder.add_text_field("image", stored=True)
-schema_builder.add_text_field("locations", stored=True)
-schema_builder.add_text_field("countries", stored=True)
-schema_builder.add_text_field("genres", stored=True)
-schema_builder.add_text_field("tmdb_overview", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("tmdb_poster_path", stored=True)
-schema_builder.add_text_field("trailer", stored=True)
-
-# Integer-Felder
-schema_builder.add_integer_field("id", stored=True, indexed=True)
-schema_builder.add_integer_field("follower", stored=True, fast=True)
-schema_builder.add_integer_field("score", stored=True, fast=True)
-schema_builder.add_integer_field("start", stored=True, fast=True)
-schema_builder.add_integer_field("tmdb_genre_ids", stored=True, indexed=True)
-schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
-
-# Float-Felder
-schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
-schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
-
-# Facettenfelder
-schema_builder.add_facet_field("facet_locations")
-schema_builder.add_facet_field("facet_countries")
-schema_builder.add_facet_field("facet_genres")
-
-schema = schema_builder.build()
-index = Index(schema, path=str(INDEX_PATH))
-index.reload()
-searcher = index.searcher()
+# Zeitmessung für diesen Rerun (Log-Zeile, mit ?debug=1 auch als Panel)
+tracing.start("seite1")
+
+# Index einmal pro Prozess öffnen; neu geladen wird nur nach einem Commit
+catalog = get_catalog()
+index = catalog.index
+store = get_card_store(catalog)  # Card-Felder aller Serien, einmal je Index-Generation
+searcher = store.searcher  # Treffer-Adressen passen so zu store.by_address
 
 st.set_page_config(layout="wide")
 with open("styles.html", "r") as f:
@@ -71,23 +46,17 @@ q = qp.get("q", "")
 # ----- Detail View -----
 
 @st.dialog("Details")
-def show_detail_dialog(detail_doc):
-    detail_title = detail_doc["title"][0]
-    detail_overview_src = detail_doc["tmdb_overview"] or detail_doc["description"]
-    detail_overview = detail_overview_src[0]
-    detail_poster = detail_doc["tmdb_poster_path"]
-    detail_poster_url = (TMDB_PATH_SMALL + detail_poster[0]) if detail_poster else ""
-    trailer = detail_doc["trailer"]
-    video_key = detail_doc["trailer"][0] if trailer else ""
-
-    rating_list = detail_doc["tmdb_vote_average"]
-    raw_rating = float(rating_list[0]) if rating_list else 0.0
+def show_detail_dialog(card):
+    detail_title = card.title
+    detail_overview = card.overview
+    detail_poster_url = (TMDB_PATH_SMALL + card.poster) if card.poster else ""
+    video_key = card.trailer or ""
+
+    raw_rating = card.rating
     rating = raw_rating / 2
-    year_list = detail_doc["start"]
-    year = str(year_list[0]) if year_list else ""
+    year = str(card.start) if card.start is not None else ""
 
-    countries_list = detail_doc["countries"]
-    countries = ", ".join(countries_list) if countries_list else ""
+    countries = ", ".join(card.countries)
     if countries == "United States of America":
         countries = "USA"
     elif countries == "United Kingdom":
@@ -125,7 +94,7 @@ def show_detail_dialog(detail_doc):
         unsafe_allow_html=True
     )
 
-    genres = detail_doc["genres"]
+    genres = card.genres
     tags_html = "<div>"
     if genres is not None:
         for tag in genres:
@@ -147,12 +116,9 @@ def show_detail_dialog(detail_doc):
 
 
 if view == "detail" and selected_id:
-    q_t = index.parse_query(selected_id, ["id"])
-    hits = searcher.search(q_t, 1).hits
-    if hits:
-        _, addr = hits[0]
-        detail_doc = searcher.doc(addr)
-        show_detail_dialog(detail_doc)
+    detail_card = store.get(selected_id)
+    if detail_card is not None:
+        show_detail_dialog(detail_card)
 
 
 
@@ -163,40 +129,14 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-all_hits = searcher.search(Query.all_query(), 500).hits
-
-def display_series_cards(hits, title="Serien", randomize=False, sort_key=None, reverse=True):
-
-    cards_html = []
-    limit = 12
-
-    hits_to_show = hits.copy()
-    if randomize:
-        random.shuffle(hits_to_show)
-    elif sort_key:
-        hits_to_show = sorted(hits_to_show, key=sort_key, reverse=reverse)
+# Reihen kommen vorberechnet aus der Sidecar-Datei des Index (siehe shelves.py):
+# nur IDs von Serien mit Poster, einmal je Index-Generation gelesen.
+shelf_ids = shelves.load(catalog)
 
-    count = 0
-    for score, addr in hits_to_show:
-        if count >= limit:
-            break
 
-        doc = searcher.doc(addr)
-        poster = doc["tmdb_poster_path"]
-        if not poster:
-            continue
-
-        doc_id = doc["id"][0]
-        title_card = doc["title"][0]
-        poster_url = TMDB_PATH + poster[0]
-        href = f"?view=detail&id={doc_id}&q={up.quote(q, safe='')}"
-
-        img_tag = f'<img src="{poster_url}" loading="lazy" alt="poster">'
-        cards_html.append(
-            f"""<a class="card" href="{href}" target="_self">{img_tag}<div class="t">{title_card}</div></a>"""
-        )
-
-        count += 1
+def display_series_cards(ids, title="Serien"):
+    # Fertige Card-Fragmente aus dem Cache (siehe fragments.py)
+    cards_html = fragments.render(catalog, ids, fragments.SHELF, q, limit=SHELF_LIMIT)
 
     st.markdown(
         f"<h2 style='font-size:1.5em; padding: 1em 0 0.3em 1em; margin-top:0.5em; border-top:1px solid white'>{title}</h2>",
@@ -204,11 +144,13 @@ def display_series_cards(hits, title="Serien", randomize=False, sort_key=None, r
     )
     utils.display_random_items(cards_html)
 
-# Zufällige Serien
-display_series_cards(all_hits, title="Lass den Zufall entscheiden", randomize=True)
+# Zufällige Serien (direkt aus dem Pool gezogen, stabil je Sitzung)
+display_series_cards(shelves.sample(catalog, SHELF_LIMIT, utils.session_seed()), title="Lass den Zufall entscheiden")
 
 # Neueste Serien (nach Start)
-display_series_cards(all_hits, title="Neueste Serien", sort_key=lambda x: float(searcher.doc(x[1])["start"][0]) if searcher.doc(x[1])["start"] else 0)
+display_series_cards(shelf_ids["newest"], title="Neueste Serien")
+
+# Beliebteste Serien (nach Popularität)
+display_series_cards(shelf_ids["popular"], title="Beliebteste Serien")
 
-# Beliebteste Serien (nach Score)
-display_series_cards(all_hits, title="Beliebteste Serien", sort_key=lambda x: float(searcher.doc(x[1])["tmdb_popularity"][0]) if searcher.doc(x[1])["tmdb_popularity"] else 0)
\ No newline at end of file
+tracing.finish()
@@ -1,53 +1,30 @@
 import urllib.parse as up
 from typing import Any
 import streamlit as st
-import json
-from tantivy import Query, Index, SchemaBuilder, Occur
 
 import utils
+import tracing
+import fragments
+import filters
+import search
+from cards import get_card_store
+from catalog import get_catalog
+from search import RATING_OPTIONS
 
 # Konstanten
 TMDB_PATH = "https://image.tmdb.org/t/p/original"
 TMDB_PATH_SMALL = "https://image.tmdb.org/t/p/w200"
-INDEX_PATH = "serien_300"  # bestehendes Tantivy-Index-Verzeichnis
 TOP_K = 20          # wie viele Ergebnisse angezeigt werden sollen
 CARDS_PER_PAGE = 3 # Cards, die in der zufälligen Anzeige auftauchen
 
-schema_builder = SchemaBuilder()
-# Text-Felder
-schema_builder.add_text_field("wikidata", stored=True)
-schema_builder.add_text_field("url", stored=True)
-schema_builder.add_text_field("title", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("description", stored=True, tokenizer_name='en_stem')  # Multi-valued text field
-schema_builder.add_text_field("image", stored=True)
-schema_builder.add_text_field("locations", stored=True)
-schema_builder.add_text_field("countries", stored=True)
-schema_builder.add_text_field("genres", stored=True)
-schema_builder.add_text_field("tmdb_overview", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("tmdb_poster_path", stored=True)
-schema_builder.add_text_field("trailer", stored=True)
-
-# Integer-Felder
-schema_builder.add_integer_field("id", stored=True, indexed=True)
-schema_builder.add_integer_field("follower", stored=True, fast=True)
-schema_builder.add_integer_field("score", stored=True, fast=True)
-schema_builder.add_integer_field("start", stored=True, fast=True)
-schema_builder.add_integer_field("tmdb_genre_ids", stored=True, indexed=True)
-schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
-
-# Float-Felder
-schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
-schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
-
-# Facettenfelder
-schema_builder.add_facet_field("facet_locations")
-schema_builder.add_facet_field("facet_countries")
-schema_builder.add_facet_field("facet_genres")
-
-schema = schema_builder.build()
-index = Index(schema, path=str(INDEX_PATH))
-index.reload()
-searcher = index.searcher()
+# Zeitmessung für diesen Rerun (Log-Zeile, mit ?debug=1 auch als Panel)
+tracing.start("seite2")
+
+# Index einmal pro Prozess öffnen; neu geladen wird nur nach einem Commit
+catalog = get_catalog()
+index = catalog.index
+store = get_card_store(catalog)  # Card-Felder aller Serien, einmal je Index-Generation
+searcher = store.searcher  # Treffer-Adressen passen so zu store.by_address
 
 st.set_page_config(layout="wide")
 with open("styles.html", "r") as f:
@@ -83,6 +60,7 @@ qp = get_qp()
 view = qp.get("view")
 selected_id = qp.get("id")
 q = qp.get("q", "")  # <-- keep the query in the URL
+page = utils.get_page(qp)  # aktuelle Ergebnisseite
 
 
 # ----- Columns definieren -----
@@ -98,27 +76,30 @@ with col1:
 
     if enter_triggered or button_triggered:
         if query_text:
-            # Speichert die Anfrageparameter und lädt die Seite erneut
+            # Speichert die Anfrageparameter und lädt die Seite erneut (ab Seite 1)
+            st.query_params.pop("page", None)
             st.query_params.update({"q": up.quote(query_text, safe=''), "view": "grid"})
             st.rerun()
 
     st.markdown("---")
     st.subheader("Filter")
 
+    # Trefferzahlen je Checkbox für den aktuellen Suchbegriff und die aktuelle
+    # Auswahl (Checkbox-Zustände stehen bereits im Session State)
+    facet_counts = search.facet_counts(
+        catalog,
+        q,
+        [f for f in filters.genre_table().groups if st.session_state.get(f"genre_{f}")],
+        [f for f in filters.country_table().groups if st.session_state.get(f"country_{f}")],
+        [r for r in RATING_OPTIONS if st.session_state.get(f"rating_{r[0]}")],
+    )
+
 
     st.set_page_config(layout="wide")
 
     # ----- Genres Filter -----
-    with open("genres.json", "r", encoding="utf-8") as f:
-        GENRE_DATA = json.load(f)
-
-    ALL_GENRE_FILTERS = sorted(
-        set(
-            g["filter"] for g in GENRE_DATA
-        ).union(
-            g.get("filter2") for g in GENRE_DATA if g.get("filter2")
-        )
-    )
+    # Kompilierte Zuordnung aus genres.json (einmal pro Prozess geladen)
+    ALL_GENRE_FILTERS = filters.genre_table().groups
 
     if "selected_genres" not in st.session_state:
         st.session_state.selected_genres = []
@@ -133,11 +114,14 @@ with col1:
 
 
     def toggle_all_genres():
+        # Neue Filterauswahl beginnt wieder auf Seite 1 (wie die Suche)
+        st.query_params.pop("page", None)
         value = st.session_state.master_genres
         for f in ALL_GENRE_FILTERS:
             st.session_state[f"genre_{f}"] = value
 
     def update_master_genres():
+        st.query_params.pop("page", None)
         all_checked = all(
             st.session_state[f"genre_{f}"] for f in ALL_GENRE_FILTERS
         )
@@ -155,7 +139,7 @@ with col1:
 
         for f in ALL_GENRE_FILTERS:
             checked = st.checkbox(
-                f,
+                f"{f} ({facet_counts['genres'].get(f, 0)})",
                 key=f"genre_{f}",
                 on_change=update_master_genres
             )
@@ -166,12 +150,8 @@ with col1:
 
 
     # ----- Länder Filter -----
-    with open("countries.json", "r", encoding="utf-8") as f:
-        COUNTRY_DATA = json.load(f)
-
-    ALL_COUNTRY_FILTERS = sorted(
-        set(c["filter"] for c in COUNTRY_DATA)
-    )
+    # Kompilierte Zuordnung aus countries.json (einmal pro Prozess geladen)
+    ALL_COUNTRY_FILTERS = filters.country_table().groups
 
     if "selected_countries" not in st.session_state:
         st.session_state.selected_countries = []
@@ -186,11 +166,13 @@ with col1:
 
 
     def toggle_all_countries():
+        st.query_params.pop("page", None)
         value = st.session_state.master_countries
         for f in ALL_COUNTRY_FILTERS:
             st.session_state[f"country_{f}"] = value
 
     def update_master_countries():
+        st.query_params.pop("page", None)
         all_checked = all(
             st.session_state[f"country_{f}"] for f in ALL_COUNTRY_FILTERS
         )
@@ -209,7 +191,7 @@ with col1:
 
         for f in ALL_COUNTRY_FILTERS:
             checked = st.checkbox(
-                f,
+                f"{f} ({facet_counts['countries'].get(f, 0)})",
                 key=f"country_{f}",
                 on_change=update_master_countries
             )
@@ -223,21 +205,12 @@ with col1:
     filter_full_star = "★"
 
     def render_stars(min_r, max_r):
-        if max_r is 0.5:
+        if max_r == 0.5:
             return "Keine Bewertung"
 
         star_count = int(max_r + 0.1)
         return filter_full_star * star_count
 
-    RATING_OPTIONS = [
-        (4.5, 5.01),  # 5 Sterne
-        (3.5, 4.5),  # 4 Sterne
-        (2.5, 3.5),  # 3 Sterne
-        (1.5, 2.5),  # 2 Sterne
-        (0.5, 1.5),  # 1 Stern
-        (0.0, 0.5)  # Keine Bewertung oder 0 Sterne
-    ]
-
     if "selected_ratings" not in st.session_state:
         st.session_state.selected_ratings = []
 
@@ -251,11 +224,13 @@ with col1:
 
 
     def toggle_all_ratings():
+        st.query_params.pop("page", None)
         value = st.session_state.master_ratings
         for r in RATING_OPTIONS:
             st.session_state[f"rating_{r[0]}"] = value
 
     def update_master_ratings():
+        st.query_params.pop("page", None)
         all_checked = all(
             st.session_state[f"rating_{r[0]}"] for r in RATING_OPTIONS
         )
@@ -277,11 +252,12 @@ with col1:
 
         for r in RATING_OPTIONS:
             min_r, max_r = r
-            label = render_stars(min_r, max_r)
+            label = f"{render_stars(min_r, max_r)} ({facet_counts['ratings'][r]})"
 
             checked = st.checkbox(
                 label,
-                key=f"rating_{min_r}"
+                key=f"rating_{min_r}",
+                on_change=update_master_ratings
             )
 
             if checked:
@@ -296,26 +272,21 @@ with col2:
     # ----- Detail View -----
 
     if view == "detail" and selected_id:
-        q_t = index.parse_query(selected_id, ["id"])
-        detail_hits = searcher.search(q_t, 1).hits
-        detail_score, detail_address = detail_hits[0]
-        detail_doc = searcher.doc(detail_address)
-
-        detail_title = detail_doc["title"][0]
-        detail_overview_src = detail_doc["tmdb_overview"] or detail_doc["description"]
-        detail_overview = detail_overview_src[0]
-        detail_poster = detail_doc["tmdb_poster_path"]
-        detail_poster_url = (TMDB_PATH_SMALL + detail_poster[0]) if detail_poster else ""
-        trailer = detail_doc["trailer"]
-        video_key = detail_doc["trailer"][0] if trailer else ""
-
-        rating_list = detail_doc["tmdb_vote_average"]
-        raw_rating = float(rating_list[0]) if rating_list else 0.0
+        card = store.get(selected_id)
+        if card is None:
+            st.warning("Serie nicht gefunden.")
+            tracing.finish()
+            st.stop()
+
+        detail_title = card.title
+        detail_overview = card.overview
+        detail_poster_url = (TMDB_PATH_SMALL + card.poster) if card.poster else ""
+        video_key = card.trailer or ""
+
+        raw_rating = card.rating
         rating = raw_rating / 2
-        year_list = detail_doc["start"]
-        year = str(year_list[0]) if year_list else ""
-        countries_list = detail_doc["countries"]
-        countries = ", ".join(countries_list) if countries_list else ""
+        year = str(card.start) if card.start is not None else ""
+        countries = ", ".join(card.countries)
         if countries == "United States of America":
             countries = "USA"
         elif countries == "United Kingdom":
@@ -358,7 +329,7 @@ with col2:
             unsafe_allow_html=True
         )
 
-        genres = detail_doc["genres"]
+        genres = card.genres
         tags_html = "<div>"
         if genres is not None:
             for tag in genres:
@@ -378,6 +349,7 @@ with col2:
             st.query_params.update({"view": "grid"})
             st.query_params.pop("id", None)
             st.rerun()
+        tracing.finish()
         st.stop()
 
 
@@ -394,103 +366,25 @@ with col2:
             unsafe_allow_html=True
         )
 
-        hits = searcher.search(Query.all_query(), 1000).hits
-        cards_html = ['<div class="grid">']
-        match_found = False
-
-        for score, addr in hits:
-            doc = searcher.doc(addr)
-
-            doc_id = doc["id"][0]
-            title = doc["title"][0]
-
-            poster = doc["tmdb_poster_path"]
-            poster_url = (TMDB_PATH_SMALL + poster[0]) if poster else ""
-
-            try:
-                doc_genres = doc["genres"]
-            except:
-                doc_genres = []
-
-            try:
-                doc_countries = doc["countries"]
-            except:
-                doc_countries = []
-
-            try:
-                raw_rating = float(doc["tmdb_vote_average"][0])
-                rating_5 = raw_rating / 2
-            except:
-                rating_5 = 0
-
-            genre_match = False
-            country_match = False
-            rating_match = False
-
-            # Genre Match
-            if selected_genre_filters:
-                for g in doc_genres:
-                    for entry in GENRE_DATA:
-                        if entry["tag"].lower() == g.lower():
-                            filters = [entry["filter"]]
-                            if entry.get("filter2"):
-                                filters.append(entry["filter2"])
-
-                            if any(f in selected_genre_filters for f in filters):
-                                genre_match = True
-                                break
-                    if genre_match:
-                        break
-
-            # Country Match
-            if selected_country_filters:
-                for c in doc_countries:
-                    for entry in COUNTRY_DATA:
-                        if entry["tag"].lower() == c.lower():
-                            if entry["filter"] in selected_country_filters:
-                                country_match = True
-                                break
-                    if country_match:
-                        break
-
-            # Rating Match
-            if selected_rating_filters:
-                for min_r, max_r in selected_rating_filters:
-                    if min_r <= rating_5 < max_r:
-                        rating_match = True
-                        break
-            else:
-                rating_match = True
-
-            # OR-Logik
-            matches = True
-
-            if selected_genre_filters and not genre_match:
-                matches = False
-
-            if selected_country_filters and not country_match:
-                matches = False
-
-            if selected_rating_filters and not rating_match:
-                matches = False
-
-            if matches:
-                match_found = True
-
-                href = f"?view=detail&id={doc_id}"
-                img_tag = f'<img src="{poster_url}" loading="lazy" alt="poster">' if poster_url else ""
-
-                cards_html.append(
-                    f'<a class="card" href="{href}" target="_self">{img_tag}<div class="t">{title}</div></a>'
-                )
-
-        cards_html.append("</div>")
-
-        if match_found:
-            st.markdown("".join(cards_html), unsafe_allow_html=True)
+        # Filter (und ggf. Suchbegriff) direkt im Index auswerten
+        filter_query = search.filter_query(
+            search.text_query(index, q) if q else None,
+            selected_genre_filters,
+            selected_country_filters,
+            selected_rating_filters,
+        )
+        hits, total, page = search.paginate(searcher, filter_query, page)
+        # Nur die Cards der aktuellen Seite; das HTML kommt aus dem Fragment-Cache
+        ids = [card.id for _, card in search.page_cards(store, hits)]
+        cards_html = fragments.render(catalog, ids, fragments.GRID, q, page=page)
+
+        if hits:
+            utils.display_grid(cards_html)
+            utils.display_pager(page, total, search.PAGE_SIZE, key="filter_pager")
         else:
             st.warning("Keine Serien entsprechen den gewählten Filtern.")
 
+        tracing.finish()
         st.stop()
 
     # Raster (Grid) darstellen, wenn q existiert
@@ -499,40 +393,22 @@ with col2:
             f"<h2 style='margin-bottom: 1em;'>Such-Ergebnisse</h2>",
             unsafe_allow_html=True
         )
-        unquoted_q = up.unquote(q).lower()
-        query = unquoted_q.strip()
-        terms = query.split()
-        boolean_parts = []
-        for term in terms:
-            u_q = index.parse_query(term, ["title"])  # uses en_stem for "title"
-            boolean_parts.append((Occur.Must, u_q))
-        boolean_query = Query.boolean_query(boolean_parts)
-        hits = searcher.search(boolean_query, 50).hits
+        # BM25 über Titel, Inhaltsangabe und Beschreibung (siehe search.py)
+        hits, total, page = search.search(catalog, q, page, searcher=searcher)
 
         if not hits:
             st.warning("Keine Ergebnisse gefunden.")
         else:
-            # Erstelle das Grid mit klickbaren Thumbnails
-            cards_html = ['<div class="grid">']
-
-            for score, addr in hits:
-                doc = searcher.doc(addr)
-                doc_id = doc["id"][0]
-                title = doc["title"][0]
-                start = doc["start"][0] if doc["start"] else ""
-                poster = doc["tmdb_poster_path"]
-                poster_url = (TMDB_PATH_SMALL + poster[0]) if poster else ""
-                href = f"?view=detail&id={doc_id}&q={up.quote(q, safe='')}"
-                img_tag = f'<img src="{poster_url}" loading="lazy" alt="poster">' if poster_url else ""
-                cards_html.append(
-                    f"""<a class="card" href="{href}" target="_self">{img_tag}<div class="t">{title}</div></a>""")
-
-            cards_html.append("</div>")
-            st.markdown("".join(cards_html), unsafe_allow_html=True)
+            # Grid mit klickbaren Thumbnails; das HTML kommt aus dem Fragment-Cache
+            ids = [card.id for _, card in search.page_cards(store, hits)]
+            utils.display_grid(fragments.render(catalog, ids, fragments.GRID, q, page=page))
+            utils.display_pager(page, total, search.PAGE_SIZE, key="search_pager")
 
     else:
         st.markdown(
             "<h1 style='margin-top:-20px;'>Durchstöbern</h1>",
             unsafe_allow_html=True
         )
-        st.info("Gib einen Suchbegriff ein oder nutze die Filter, um Serien gezielt einzugrenzen.")
\ No newline at end of file
+        st.info("Gib einen Suchbegriff ein oder nutze die Filter, um Serien gezielt einzugrenzen.")
+
+tracing.finish()
@@ -0,0 +1,108 @@
+"""
+Vorberechnete Reihen der Startseite als Sidecar-Datei im Index-Verzeichnis.
+
+Nach jedem Commit schreibt die Indexierung `shelves.json`: die IDs der
+neuesten (`start`) und beliebtesten (`tmdb_popularity`) Serien mit
+Poster – je `SHELF_SIZE` Stück in Anzeigereihenfolge – sowie alle IDs
+mit Poster als Pool für die Zufallsreihe. Die Startseite liest die Datei
+mit `load` einmal je Index-Generation; eine Reihe anzuzeigen kostet danach
+nur noch O(K), unabhängig von der Katalog-Größe. `sample` zieht
+Zufallsreihen direkt aus dem Pool (O(N) für N Serien, ohne Docstore-
+Zugriffe); mit einem Seed je Sitzung bleibt die Auswahl über Reruns
+hinweg stabil.
+
+Die Datei trägt den Opstamp aus `meta.json`. Fehlt sie oder passt der
+Opstamp nicht (Index ohne Sidecar oder von einem anderen Werkzeug
+geschrieben), berechnet `load` die Reihen direkt aus dem Index.
+"""
+
+import json
+import os
+import random
+import threading
+
+from tantivy import Query
+
+import tracing
+
+SHELVES_FILE = "shelves.json"
+SHELF_SIZE = 24  # IDs je sortierter Reihe
+SHELF_FIELDS = {"newest": "start", "popular": "tmdb_popularity"}
+
+
+def _opstamp(index_path: str) -> int | None:
+    try:
+        with open(os.path.join(index_path, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("opstamp")
+    except (OSError, ValueError):
+        return None
+
+
+def compute(searcher, size: int = SHELF_SIZE) -> dict:
+    """Reihen aus dem Index: je Feld die ersten `size` IDs mit Poster, dazu der Pool."""
+    hits = searcher.search(Query.all_query(), max(1, searcher.num_docs), count=False).hits
+    with_poster = {}
+    for _, addr in hits:
+        doc = searcher.doc(addr)
+        if doc.get_first("tmdb_poster_path"):
+            with_poster[addr.segment_ord, addr.doc] = doc.get_first("id")
+
+    shelves = {"pool": sorted(with_poster.values())}
+    for name, field in SHELF_FIELDS.items():
+        ordered = searcher.search(Query.all_query(), max(1, searcher.num_docs), count=False,
+                                  order_by_field=field).hits
+        ids = []
+        for _, addr in ordered:
+            doc_id = with_poster.get((addr.segment_ord, addr.doc))
+            if doc_id is not None:
+                ids.append(doc_id)
+                if len(ids) >= size:
+                    break
+        shelves[name] = ids
+    return shelves
+
+
+def write(index_path: str, searcher, size: int = SHELF_SIZE) -> dict:
+    """Reihen berechnen und atomar als Sidecar neben dem Index ablegen."""
+    shelves = {"opstamp": _opstamp(index_path), **compute(searcher, size)}
+    path = os.path.join(index_path, SHELVES_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(shelves, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+    return shelves
+
+
+_shelves: dict[str, tuple] = {}
+_shelves_lock = threading.Lock()
+
+
+def _read(catalog, searcher) -> dict:
+    try:
+        with open(os.path.join(catalog.path, SHELVES_FILE), "r", encoding="utf-8") as f:
+            shelves = json.load(f)
+    except (OSError, ValueError):
+        shelves = None
+    if shelves is None or shelves.get("opstamp") != _opstamp(catalog.path):
+        shelves = compute(searcher)
+    return shelves
+
+
+def load(catalog) -> dict:
+    # Einmal je Index-Generation lesen (wie der CardStore, siehe cards.py)
+    searcher, generation = catalog.current()
+    cached = _shelves.get(catalog.path)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    with _shelves_lock:
+        cached = _shelves.get(catalog.path)
+        if cached is None or cached[0] != generation:
+            with tracing.span("shelves.load"):
+                cached = _shelves[catalog.path] = (generation, _read(catalog, searcher))
+    return cached[1]
+
+
+def sample(catalog, n: int, seed=None) -> list[int]:
+    """`n` verschiedene zufällige IDs von Serien mit Poster; mit `seed` reproduzierbar."""
+    pool = load(catalog)["pool"]
+    rng = random.Random(seed) if seed is not None else random
+    return rng.sample(pool, min(n, len(pool)))
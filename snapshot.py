@@ -0,0 +1,190 @@
+"""
+Spaltenbasierter Zwischenstand der Anreicherung (Parquet).
+
+Die Anreicherung (indexing.py, Stufe "enrich") schreibt je Serie die
+CSV-Felder, die Wikipedia-Zusammenfassung, die TMDB-Felder und den
+Trailer-Key in eine zstd-komprimierte Parquet-Datei. Die Stufe "index"
+baut daraus – ohne Netzwerkzugriffe – einen Tantivy-Index mit beliebigem
+Schema oder Tokenizer.
+
+Während der Anreicherung werden Checkpoints als Teil-Dateien in
+`<snapshot>.parts/` abgelegt; `compact` fasst sie am Ende (oder beim
+nächsten Lauf) mit der Hauptdatei zusammen. Bei mehrfach vorkommenden
+Schlüsseln gewinnt der zuletzt geschriebene Eintrag. Alle Zugriffe lesen
+batchweise bzw. nur einzelne Spalten, damit auch Snapshots mit Millionen
+Einträgen nicht vollständig in den Speicher geladen werden.
+"""
+
+import os
+import re
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SNAPSHOT_PATH = "serien_snapshot.parquet"
+COMPRESSION = "zstd"
+BATCH_SIZE = 1024  # Zeilen je gelesenem Record-Batch
+PART_NAME = re.compile(r"part-(\d+)\.parquet")  # Teil-Dateien, nach Nummer geordnet
+
+SCHEMA = pa.schema([
+    # Verwaltung: Zeilenschlüssel, Inhalts-Hash der CSV-Zeile, Dokument-ID
+    ("key", pa.string()),
+    ("hash", pa.string()),
+    ("id", pa.int64()),
+    ("skipped", pa.bool_()),  # keine Wikipedia-Seite – wird nicht indexiert
+    ("tmdb_error", pa.bool_()),  # TMDB-Abfrage fehlgeschlagen – wird im nächsten Lauf wiederholt
+    # CSV-Felder (siehe indexing.preprocess)
+    ("series", pa.string()),
+    ("wikipediaPage", pa.string()),
+    ("seriesLabel", pa.string()),
+    ("imdb", pa.string()),
+    ("wiki_title", pa.string()),
+    ("follower", pa.int64()),
+    ("score", pa.int64()),
+    ("start", pa.int64()),
+    ("image", pa.string()),
+    ("locations", pa.list_(pa.string())),
+    ("countries", pa.list_(pa.string())),
+    ("genres", pa.list_(pa.string())),
+    # Wikipedia
+    ("description", pa.string()),
+    # TMDB
+    ("tmdb_id", pa.int64()),
+    ("tmdb_overview", pa.string()),
+    ("tmdb_poster_path", pa.string()),
+    ("tmdb_genre_ids", pa.list_(pa.int64())),
+    ("tmdb_popularity", pa.float64()),
+    ("tmdb_vote_average", pa.float64()),
+    ("tmdb_vote_count", pa.int64()),
+    ("tmdb_seasons", pa.int64()),
+    ("tmdb_networks", pa.list_(pa.string())),
+    ("trailer", pa.string()),
+])
+
+
+def parts_dir(path: str) -> str:
+    return path + ".parts"
+
+
+def _write(table: pa.Table, path: str) -> None:
+    # Atomar ersetzen, damit ein Abbruch keine halbe Datei hinterlässt
+    pq.write_table(table, path + ".tmp", compression=COMPRESSION)
+    os.replace(path + ".tmp", path)
+
+
+def _parts(path: str) -> list[tuple[int, str]]:
+    # (Nummer, Datei) der Teil-Dateien, aufsteigend nach Nummer; andere Dateien zählen nicht
+    directory = parts_dir(path)
+    if not os.path.isdir(directory):
+        return []
+    parts = []
+    for name in os.listdir(directory):
+        match = PART_NAME.fullmatch(name)
+        if match:
+            parts.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(parts)
+
+
+def next_part(path: str) -> int:
+    """Nummer für die nächste Teil-Datei (höchste vorhandene + 1)."""
+    parts = _parts(path)
+    return parts[-1][0] + 1 if parts else 0
+
+
+def write_part(path: str, rows: list[dict], number: int | None = None) -> str:
+    """
+    Checkpoint: `rows` als Teil-Datei Nummer `number` neben dem Snapshot ablegen.
+
+    Spätere Nummern gewinnen beim Lesen. Wer viele Teile schreibt, holt die
+    Nummer einmal mit `next_part` und zählt selbst weiter; ohne `number`
+    wird das Verzeichnis jedes Mal durchsucht.
+    """
+    directory = parts_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    if number is None:
+        number = next_part(path)
+    part = os.path.join(directory, f"part-{number:010d}.parquet")
+    _write(pa.Table.from_pylist(rows, schema=SCHEMA), part)
+    return part
+
+
+def _files(path: str) -> list[str]:
+    files = [path] if os.path.exists(path) else []
+    return files + [file for _, file in _parts(path)]
+
+
+def load_index(path: str = SNAPSHOT_PATH) -> dict[str, dict]:
+    """Hash, ID, TMDB-ID und TMDB-Fehler je Schlüssel aus Snapshot und Teil-Dateien, je Schlüssel der neueste."""
+    entries = {}
+    for file in _files(path):
+        for key, row_hash, row_id, tmdb_id, tmdb_error in read_columns(
+                file, ["key", "hash", "id", "tmdb_id", "tmdb_error"]):
+            entries[key] = {"hash": row_hash, "id": row_id, "tmdb_id": tmdb_id, "tmdb_error": bool(tmdb_error)}
+    return entries
+
+
+def _batches(file: str, batch_size: int = BATCH_SIZE):
+    # Ältere Snapshots ohne neuere Spalten: fehlende Spalten als leer ergänzen
+    parquet = pq.ParquetFile(file, memory_map=True)
+    for batch in parquet.iter_batches(batch_size=batch_size):
+        if batch.schema != SCHEMA:
+            batch = pa.RecordBatch.from_arrays([
+                batch.column(field.name) if field.name in batch.schema.names
+                else pa.nulls(batch.num_rows, field.type)
+                for field in SCHEMA
+            ], schema=SCHEMA)
+        yield batch
+
+
+def compact(path: str = SNAPSHOT_PATH, keep_keys=None) -> int:
+    """
+    Snapshot und Teil-Dateien zu einer Datei zusammenfassen.
+
+    Mit `keep_keys` fallen Einträge weg, deren Zeile es in den CSV-Daten
+    nicht mehr gibt. Im Speicher liegen nur die Schlüssel; die Einträge
+    selbst werden batchweise umkopiert. Liefert die Anzahl der Einträge.
+    """
+    files = _files(path)
+    # 1. Durchlauf: nur die Schlüsselspalte – wo steht der neueste Eintrag?
+    latest = {}
+    for number, file in enumerate(files):
+        for row, (key,) in enumerate(read_columns(file, ["key"])):
+            latest[key] = (number, row)
+    if keep_keys is not None:
+        latest = {key: position for key, position in latest.items() if key in keep_keys}
+    wanted = [set() for _ in files]
+    for number, row in latest.values():
+        wanted[number].add(row)
+
+    # 2. Durchlauf: gewünschte Zeilen je Batch übernehmen
+    with pq.ParquetWriter(path + ".tmp", SCHEMA, compression=COMPRESSION) as writer:
+        for number, file in enumerate(files):
+            offset = 0
+            for batch in _batches(file):
+                mask = pa.array([offset + row in wanted[number] for row in range(batch.num_rows)])
+                offset += batch.num_rows
+                writer.write_batch(batch.filter(mask))
+    os.replace(path + ".tmp", path)
+    shutil.rmtree(parts_dir(path), ignore_errors=True)
+    return len(latest)
+
+
+def clear(path: str = SNAPSHOT_PATH) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+    shutil.rmtree(parts_dir(path), ignore_errors=True)
+
+
+def read_columns(path: str, columns: list[str]):
+    """Nur die angegebenen Spalten, zeilenweise als Tupel (fehlende Spalten als None)."""
+    names = pq.read_schema(path).names
+    table = pq.read_table(path, columns=[name for name in columns if name in names], memory_map=True)
+    return zip(*(table.column(name).to_pylist() if name in names else [None] * table.num_rows
+                 for name in columns))
+
+
+def iter_rows(path: str = SNAPSHOT_PATH, batch_size: int = BATCH_SIZE):
+    """Einträge des (kompaktierten) Snapshots, speichergemappt und batchweise gelesen."""
+    for batch in _batches(path, batch_size):
+        yield from batch.to_pylist()
@@ -0,0 +1,136 @@
+"""
+Zeitmessung je Rerun der Streamlit-Seiten.
+
+Eine Seite startet zu Beginn jedes Reruns mit `start(seite)` eine Messung
+und beendet sie mit `finish()` (auch vor jedem `st.stop()`). Dazwischen
+messen `span(name)`-Blöcke die Dauer einzelner Schritte – Index öffnen und
+neu laden, JSON-Tabellen laden, Suchen, Cards lesen, HTML erzeugen – und
+`count(name)` zählt z. B. gelieferte Treffer oder gelesene Dokumente.
+Spans sind inklusive: ein äußerer Span enthält die Zeit der inneren.
+
+`finish()` schreibt je Rerun eine JSON-Zeile in den Logger
+"serien.trace" (stderr). Mit `?debug=1` in der URL oder der
+Umgebungsvariable SERIEN_DEBUG=1 zeigt die Seite zusätzlich ein
+Debug-Panel mit den Messwerten.
+
+Ohne laufende Messung (z. B. in indexing.py oder benchmark.py) sind
+`span` und `count` wirkungslos.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LOGGER_NAME = "serien.trace"
+DEBUG_ENV = "SERIEN_DEBUG"
+
+logger = logging.getLogger(LOGGER_NAME)
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Trace:
+    """Messwerte eines Reruns: Spans (Gesamtdauer, Aufrufe) und Zähler."""
+
+    __slots__ = ("page", "session", "started", "spans", "counters", "finished")
+
+    def __init__(self, page: str, session: str | None = None):
+        self.page = page
+        self.session = session
+        self.started = time.perf_counter()
+        self.spans: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self.finished = False
+
+    def add(self, name: str, ms: float) -> None:
+        entry = self.spans.setdefault(name, [0.0, 0])
+        entry[0] += ms
+        entry[1] += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self) -> dict:
+        return {
+            "page": self.page,
+            "session": self.session,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": {name: {"ms": round(ms, 3), "calls": calls} for name, (ms, calls) in self.spans.items()},
+            "counters": dict(self.counters),
+        }
+
+
+# Streamlit führt jede Sitzung in einem eigenen Skript-Thread aus
+_local = threading.local()
+
+
+def _session_id() -> str | None:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def start(page: str) -> Trace:
+    trace = _local.trace = Trace(page, _session_id())
+    return trace
+
+
+def current() -> Trace | None:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def span(name: str):
+    trace = current()
+    if trace is None or trace.finished:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (time.perf_counter() - started) * 1000)
+
+
+def count(name: str, n: int = 1) -> None:
+    trace = current()
+    if trace is not None and not trace.finished:
+        trace.count(name, n)
+
+
+def debug_enabled() -> bool:
+    import streamlit as st
+
+    return os.getenv(DEBUG_ENV) == "1" or st.query_params.get("debug") == "1"
+
+
+def finish() -> dict | None:
+    """Messung abschließen, Log-Zeile schreiben und ggf. das Debug-Panel zeigen."""
+    trace = current()
+    if trace is None or trace.finished:
+        return None
+    trace.finished = True
+    record = trace.to_dict()
+    logger.info("trace %s", json.dumps(record, separators=(",", ":")))
+
+    if debug_enabled():
+        import streamlit as st
+
+        with st.expander(f"Zeitmessung: {record['total_ms']:.1f} ms", expanded=False):
+            st.table([
+                {"Schritt": name, "ms": values["ms"], "Aufrufe": values["calls"]}
+                for name, values in sorted(record["spans"].items(), key=lambda item: -item[1]["ms"])
+            ])
+            st.json(record["counters"])
+    return record
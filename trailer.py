@@ -1,22 +1,98 @@
+"""
+Auswahl des Trailers aus den TMDB-Videos einer Serie.
+
+`get_keys` nimmt die Antwort von `/tv/{id}/videos` oder von
+`/tv/{id}?append_to_response=videos` – als Rohdaten (bytes/str) oder
+bereits geparst – und liefert die Keys der passenden Trailer, bestes
+Ergebnis zuerst. Rangfolge:
+
+1) offizielle Videos vor inoffiziellen,
+2) Sprache in der Reihenfolge von `langs`,
+3) höhere Auflösung,
+4) neueres Veröffentlichungsdatum.
+
+Die Videos werden in einem Durchlauf bewertet, ohne Zwischenlisten;
+`get_key` behält dabei nur den bisher besten Kandidaten. Damit lässt sich
+die Auswahl auch in großen Mengen über gecachte Antworten ausführen.
+
+Protokollierung ist optional: mit SERIEN_TRAILER_LOG=1 schreibt der
+Logger "serien.trailer" je Auswahl eine JSON-Zeile (stderr).
+"""
+
+import heapq
 import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+LOGGER_NAME = "serien.trailer"
+LOG_ENV = "SERIEN_TRAILER_LOG"
+PLATFORM = "youtube"
+LANGS = ("de", "en")
+MAX_KEYS = 3
+
+logger = logging.getLogger(LOGGER_NAME)
+if not logger.handlers:
+    if os.getenv(LOG_ENV) == "1":
+        _handler = logging.StreamHandler(sys.stderr)
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(_handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+    else:
+        logger.addHandler(logging.NullHandler())
+
 
+def _videos(response) -> list:
+    if isinstance(response, (bytes, bytearray, str)):
+        try:
+            response = json.loads(response)
+        except ValueError:
+            return []
+    if not isinstance(response, dict):
+        return []
+    # Bei append_to_response=videos liegen die Videos unter "videos"
+    if isinstance(response.get("videos"), dict):
+        response = response["videos"]
+    results = response.get("results")
+    return results if isinstance(results, list) else []
 
-def get_key(response_text: str, platform: str = "youtube", allowed_langs: list[str] = ["de", "en"]) -> str:
+
+def _published(video: dict) -> float:
     try:
-        data = json.loads(response_text)
-        print(data)
-    except (ValueError, json.JSONDecodeError):
-        data = {}
-
-    trailers = [
-        v for v in data.get("results", [])
-        if isinstance(v, dict)
-        and v.get("site", "").lower() == platform
-        and v.get("type", "").lower() == "trailer"
-        and v.get("iso_639_1", "").lower() in allowed_langs
-    ]
-
-    key = None
-    if trailers and isinstance(trailers[0], dict):
-        key = trailers[0].get("key")
-    return key
\ No newline at end of file
+        return datetime.fromisoformat(video["published_at"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+def _ranked(videos, platform: str, langs):
+    # (Rang, Key) je passendem Trailer; kleinerer Rang = besser
+    preference = {lang: position for position, lang in enumerate(langs)}
+    for video in videos:
+        if not isinstance(video, dict) or not video.get("key"):
+            continue
+        if str(video.get("site", "")).lower() != platform or str(video.get("type", "")).lower() != "trailer":
+            continue
+        position = preference.get(str(video.get("iso_639_1", "")).lower())
+        if position is None:
+            continue
+        size = video.get("size") if isinstance(video.get("size"), int) else 0
+        rank = (not video.get("official", False), position, -size, -_published(video))
+        yield rank, video["key"]
+
+
+def get_keys(response, platform: str = PLATFORM, langs=LANGS, limit: int = MAX_KEYS) -> list[str]:
+    """Keys der passenden Trailer, bestes Ergebnis zuerst (höchstens `limit`)."""
+    videos = _videos(response)
+    best = heapq.nsmallest(limit, _ranked(videos, platform.lower(), langs), key=lambda item: item[0])
+    keys = [key for _, key in best]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("trailer %s", json.dumps({"videos": len(videos), "keys": keys}))
+    return keys
+
+
+def get_key(response, platform: str = PLATFORM, langs=LANGS) -> str | None:
+    """Key des besten Trailers oder None."""
+    keys = get_keys(response, platform, langs, limit=1)
+    return keys[0] if keys else None
@@ -1,12 +1,61 @@
 # Code ist in Anlehnung an: https://gist.github.com/treuille/2ce0acb6697f205e44e3e0f576e810b7 geschrieben
+import random
+
 import streamlit as st
 
+import tracing
+
 def display_random_items(items: list[str]):
     html = ['<div class="random-grid">']
     for item in items:
         html.append(item)
     html.append("</div>")
-    st.markdown("".join(html), unsafe_allow_html=True)
+    with tracing.span("st.markdown"):
+        st.markdown("".join(html), unsafe_allow_html=True)
+
+
+def display_grid(items: list[str]):
+    with tracing.span("st.markdown"):
+        st.markdown('<div class="grid">' + "".join(items) + "</div>", unsafe_allow_html=True)
+
+
+# Blättern durch Ergebnisseiten; die aktuelle Seite steht im Query-Parameter "page"
+def display_pager(page: int, total: int, page_size: int, key: str = "pager"):
+    n_pages = (total - 1) // page_size + 1
+    if n_pages <= 1:
+        return
+    col_prev, col_info, col_next = st.columns([1, 16, 1])
+
+    with col_prev:
+        if st.button("⟨", key=f"{key}_prev", disabled=(page == 0)):
+            st.query_params["page"] = str(page - 1)
+            st.rerun()
+
+    with col_info:
+        st.markdown(
+            f"<div style='text-align:center;'>Seite {page + 1} von {n_pages} &nbsp;·&nbsp; {total} Serien</div>",
+            unsafe_allow_html=True
+        )
+
+    with col_next:
+        if st.button("⟩", key=f"{key}_next", disabled=(page == n_pages - 1)):
+            st.query_params["page"] = str(page + 1)
+            st.rerun()
+
+
+def get_page(qp) -> int:
+    try:
+        return max(0, int(qp.get("page", 0)))
+    except ValueError:
+        return 0
+
+
+# Zufallsreihen (shelves.sample) bleiben innerhalb einer Sitzung stabil,
+# z. B. beim Öffnen und Schließen der Detailansicht
+def session_seed(key: str = "random_seed") -> int:
+    if key not in st.session_state:
+        st.session_state[key] = random.getrandbits(32)
+    return st.session_state[key]
 
 # def display_random_items(items: list[str], cards_per_page=5):
 #     n_pages = (len(items) - 1) // cards_per_page + 1